@@ -12,6 +12,7 @@ class Crop(CanvasTool):
         self.start = None
         self.hasCropped = False
         self.boundary = None
+        self.indicators = []
 
         f = self.frame
 
@@ -41,7 +42,7 @@ class Crop(CanvasTool):
     def onSizeChange(self):
         canvas = self.widget
         menu = canvas.master
-        w1, h1 = menu.imageOrig.size
+        w1, h1 = menu.history.first.size
         w2, h2 = menu.imageEdited.size
         self.lSize.config(
             text=f'Size:  {w1:>4}×{h1:<4}')
@@ -55,19 +56,37 @@ class Crop(CanvasTool):
         self.boundary = None
         canvas = self.widget
         menu = canvas.master
+        if menu.history is None:
+            # still loading
+            return
         self.bCrop.config(state='disabled')
-        menu.imageEdited = menu.imageOrig.copy()
-        menu.draw = ImageDraw.Draw(menu.imageEdited)
+
+        # Back to the first version, which can itself be undone
+        menu.commit()
+        menu.showVersion(menu.history.push(menu.history.first))
+
+    def onEditable(self, image, final):
+        canvas = self.widget
+        menu = canvas.master
+        menu.imageEdited = image
+        menu.draw = ImageDraw.Draw(image)
+        cropped = menu.version.box != menu.history.first.box
+        self.bCrop.config(state=['disabled', 'active'][cropped])
         self.onSizeChange()
     
     @bind('<Button-1>')
     def cropEventStart(self, canvas, event, menu):
+        if menu.draw is None:
+            # still loading
+            return
         self.start = (event.x, event.y)
         self.bCrop.config(text='Cropping...', state='disabled')
 
-    @bind('<B1-Motion>')
-    def cropEventPreview(self, canvas, event, menu):
-        canvas.delete('cropIndicator')
+    @bind('<B1-Motion>', coalesce=60)
+    def cropEventPreview(self, canvas, events, menu):
+        if self.start is None:
+            return
+        event = events[-1]
         x1, y1 = self.start
         x2, y2 = event.x, event.y
 
@@ -81,19 +100,27 @@ class Crop(CanvasTool):
 
         # use negative space to show what'll be excluded from crop,
         # with a cool aperture effectf
-        for args in (
+        boxes = (
             (x1, 0, w, y1),   # above crop
             (0, y2, x2, h),   # below crop
             (0, 0, x1, y2), # left of crop
             (x2, y1, w, h), # right of crop
-            ):
-            canvas.create_rectangle(
-                *args, outline='#333333', width=1, fill='gray',
-                stipple='gray50', tags='cropIndicator')
+            )
+        if not self.indicators:
+            self.indicators = [
+                canvas.create_rectangle(
+                    *box, outline='#333333', width=1, fill='gray',
+                    stipple='gray50', tags='cropIndicator')
+                for box in boxes]
+        else:
+            # Move the rectangles rather than make new ones
+            for item, box in zip(self.indicators, boxes):
+                canvas.coords(item, *box)
 
     @bind('<ButtonRelease-1>')
     def cropEventEnd(self, canvas, event, menu):
         canvas.delete('cropIndicator')
+        self.indicators = []
         
         state = ['active', 'disabled'][self.hasCropped and self.start is None]
         self.bCrop.config(text='Reset crop...', state=state)
@@ -124,10 +151,7 @@ class Crop(CanvasTool):
         y2 = int(min(y2 - by1, hVis) * hImag / hVis)
 
         self.boundary = (x1, y1, x2, y2)
-        cropped = menu.imageEdited.crop(self.boundary)
-    
-        w, h = cropped.size
-
-        if w and h:
-            menu.imageEdited = cropped
-            self.onSizeChange()
+        if x2 > x1 and y2 > y1:
+            # The cropped version shares the tiles it shows
+            menu.commit()
+            menu.showVersion(menu.history.push(menu.version.crop(self.boundary)))
@@ -0,0 +1,135 @@
+'''Edit history: image versions sharing unchanged tiles, for cheap undo and redo.'''
+
+from PIL import Image
+
+class TiledImage:
+    '''
+    An image kept as a grid of tiles, seen through a window box.
+
+    Versions share tiles: cropping only moves the window, and drawing
+    copies just the tiles it touches (copy-on-write). So a history of
+    versions costs memory for what was edited, not for each version.
+    '''
+    TILE = 128
+
+    def __init__(self, tiles, box, mode, palette=None):
+        self.tiles = tiles
+        self.box = box
+        self.mode = mode
+        self.palette = palette
+
+    @classmethod
+    def fromImage(cls, image):
+        T = cls.TILE
+        w, h = image.size
+        tiles = {
+            (c, r): image.crop((c * T, r * T, min(w, c * T + T), min(h, r * T + T)))
+            for r in range(-(-h // T)) for c in range(-(-w // T))}
+        palette = image.getpalette() if image.mode == 'P' else None
+        return cls(tiles, (0, 0, w, h), image.mode, palette)
+
+    @property
+    def size(self):
+        x1, y1, x2, y2 = self.box
+        return x2 - x1, y2 - y1
+
+    def _tilesWithin(self, box):
+        '''Keys of tiles overlapping a box, in tile-grid pixels.'''
+        T = self.TILE
+        x1, y1, x2, y2 = box
+        for r in range(y1 // T, (y2 - 1) // T + 1):
+            for c in range(x1 // T, (x2 - 1) // T + 1):
+                if (c, r) in self.tiles:
+                    yield c, r
+
+    def image(self):
+        '''The window as a new image, to draw on.'''
+        x1, y1, _, _ = self.box
+        im = Image.new(self.mode, self.size)
+        if self.palette:
+            im.putpalette(self.palette)
+        for c, r in self._tilesWithin(self.box):
+            im.paste(self.tiles[c, r], (c * self.TILE - x1, r * self.TILE - y1))
+        return im
+
+    def crop(self, box):
+        '''A version showing only a box of this one. No pixels are copied.'''
+        x1, y1, _, _ = self.box
+        box = (box[0] + x1, box[1] + y1, box[2] + x1, box[3] + y1)
+        tiles = {key: self.tiles[key] for key in self._tilesWithin(box)}
+        return TiledImage(tiles, box, self.mode, self.palette)
+
+    def withPixels(self, image, box):
+        '''
+        A version with a box of `image` (drawn on from this version's
+        image()) written in. Only tiles within the box are copied.
+        '''
+        T = self.TILE
+        x1, y1, x2, y2 = self.box
+        bx1, by1, bx2, by2 = box
+        box = (max(bx1 + x1, x1), max(by1 + y1, y1), min(bx2 + x1, x2), min(by2 + y1, y2))
+        if box[0] >= box[2] or box[1] >= box[3]:
+            return self
+        tiles = dict(self.tiles)
+        for c, r in self._tilesWithin(box):
+            tile = tiles[c, r].copy()
+            # The part of this tile inside both the window and box
+            px1, py1 = max(c * T, box[0]), max(r * T, box[1])
+            px2, py2 = min(c * T + T, box[2]), min(r * T + T, box[3])
+            tile.paste(
+                image.crop((px1 - x1, py1 - y1, px2 - x1, py2 - y1)),
+                (px1 - c * T, py1 - r * T))
+            tiles[c, r] = tile
+        return TiledImage(tiles, self.box, self.mode, self.palette)
+
+    def patch(self, image, other):
+        '''
+        Make `image`, which shows another version, show this one, by
+        pasting just the tiles that differ. Returns their boxes, or None
+        if the windows differ and `image` must be made afresh.
+        '''
+        if other is None or other.box != self.box:
+            return None
+        T = self.TILE
+        x1, y1, _, _ = self.box
+        w, h = self.size
+        boxes = []
+        for c, r in self._tilesWithin(self.box):
+            tile = self.tiles[c, r]
+            if tile is other.tiles.get((c, r)):
+                continue
+            image.paste(tile, (c * T - x1, r * T - y1))
+            boxes.append((
+                max(0, c * T - x1), max(0, r * T - y1),
+                min(w, c * T + T - x1), min(h, r * T + T - y1)))
+        return boxes
+
+class History:
+    '''Versions to undo and redo through. Making a new one forgets the redos.'''
+    def __init__(self, version):
+        self.undos = [version]
+        self.redos = []
+
+    @property
+    def first(self):
+        return self.undos[0]
+
+    @property
+    def current(self):
+        return self.undos[-1]
+
+    def push(self, version):
+        if version is not self.current:
+            self.undos.append(version)
+            self.redos.clear()
+        return version
+
+    def undo(self):
+        if len(self.undos) > 1:
+            self.redos.append(self.undos.pop())
+        return self.current
+
+    def redo(self):
+        if self.redos:
+            self.undos.append(self.redos.pop())
+        return self.current
@@ -1,6 +1,7 @@
 '''Editor interface, handling cropping, previews, and palette management.'''
 
 from PIL import Image, ImageTk, ImageDraw
+import math
 import re
 
 import tkinter as tk
@@ -16,6 +17,9 @@ import xstitch
 import interfaceStyle as iStyle
 
 from crop import Crop
+from history import History, TiledImage
+from pyramid import Pyramid, nearestTile
+from worker import Worker
 
 class Pencil(CanvasTool):
     def __init__(self, canvas, frameMaster, active=False):
@@ -59,7 +63,7 @@ class Pencil(CanvasTool):
     def colour(self):
         return int(self._colour.get(), base=16)
 
-    def getPixelCoordinate(self, x, y):
+    def getPixelCoordinate(self, canvas, menu, x, y):
         bx1, by1, bx2, by2 = canvas.imageExtent
         
         if not (bx1 < x < bx2 and by1 < y < by2):
@@ -74,37 +78,58 @@ class Pencil(CanvasTool):
         
     @bind('<Button-1>')
     def drawStart(self, canvas, event, menu):
-        x, y = self.getPixelCoordinate(event.x, event.y)
-        if not x:
+        if menu.draw is None:
+            # still loading
+            return
+        x, y = self.getPixelCoordinate(canvas, menu, event.x, event.y)
+        if x is None:
             return
 
         menu.draw.rectangle((x, y, x+2, y+2), fill=self.colour)
-        canvas.redraw()
+        menu.touch((x, y, x+3, y+3))
+        canvas.refresh((x, y, x+3, y+3))
         self.lastDraw = x, y
-        print(x, y)
 
-    @bind('<B1-Motion>')
-    def drawDrag(self, canvas, event, menu):
-        x, y = self.getPixelCoordinate(event.x, event.y)
-        if not x:
+    @bind('<B1-Motion>', coalesce=60)
+    def drawDrag(self, canvas, events, menu):
+        if menu.draw is None:
+            return
+        # One polyline through every point since the last frame
+        points = [self.lastDraw]
+        for event in events:
+            x, y = self.getPixelCoordinate(canvas, menu, event.x, event.y)
+            if x is not None:
+                points.append((x, y))
+        if len(points) < 2:
             return
         
-        menu.draw.line((*self.lastDraw, x, y), fill=self.colour, width=1)
-        canvas.redraw()
-        self.lastDraw = x, y
-        print(x, y)
+        menu.draw.line(points, fill=self.colour, width=1)
+        xs, ys = zip(*points)
+        box = (min(xs), min(ys), max(xs) + 1, max(ys) + 1)
+        menu.touch(box)
+        canvas.refresh(box)
+        self.lastDraw = points[-1]
+
+    @bind('<ButtonRelease-1>')
+    def drawEnd(self, canvas, event, menu):
+        # One undo step per stroke
+        menu.commit()
 
 class xsCanvas(tk.Canvas):
+    # Display tiles are separate PhotoImages, so edits redo only a few
+    TILE = 256
+
     def __init__(self, master):
         self.master = master
         tk.Canvas.__init__(self, bg='#333333', relief='ridge', bd=0)
 
         self.bind('<Configure>', lambda e: self.redraw(automatic=True))
 
-        # initialised in onResize
-        self.imagetk = None
-        self.spaceOnSides = None
-        self.prevSize = None
+        # initialised in redraw
+        self.pyramid = None
+        self.tiles = {}
+        self.imageExtent = None
+        self.imageSize = None
 
     def redraw(self, automatic=False):
         menu = self.master
@@ -116,24 +141,14 @@ class xsCanvas(tk.Canvas):
 
         menu.crop.start = None
 
-        # Draw image
-        self.delete('image')
         img = menu.imageEdited
         
         wCanv, hCanv = self.winfo_width(), self.winfo_height()
         
-        if img is None or wCanv < 10 or hCanv == 10:
+        if img is None or wCanv < 10 or hCanv < 10:
+            self.delete('image')
             return
 
-        # Check if image doesn't need resizing
-        if automatic and self.prevSize:
-            wPrev, hPrev = self.prevSize
-            if self.spaceOnSides and wPrev == wCanv or hPrev == hCanv:
-                self._drawImage()
-                return
-        
-        self.prevSize = wCanv, hCanv
-
         wImag, hImag = img.size
         if wImag == 0 or hImag == 0:
             return
@@ -141,37 +156,93 @@ class xsCanvas(tk.Canvas):
 
         # Ensure constant aspect ratio via proportion magic
 
-        self.spaceOnSides = wProp > hProp
-        if self.spaceOnSides:
+        if wProp > hProp:
             w, h = int(wImag * hProp), hCanv
         else:
             w, h = wCanv, int(hImag * wProp)
             
         # Store extent of image, so we know we've clicked on the image
-        self.imageExtent = (
+        extent = (
             (wCanv - w) // 2, (hCanv - h) // 2,
             (wCanv + w) // 2, (hCanv + h) // 2)
 
-        # Ensure pixels are not blurred
-        method = Image.BILINEAR if w < wImag else Image.NEAREST
-        
-        self.imageResized = img.resize((w, h), method)
-        self.imagetk = ImageTk.PhotoImage(self.imageResized)
+        # Same image at the same size, so the tiles only need moving
+        if (self.pyramid is not None and self.pyramid.image is img
+                and self.imageSize == (w, h)):
+            self.move(
+                'image', extent[0] - self.imageExtent[0],
+                extent[1] - self.imageExtent[1])
+            self.imageExtent = extent
+            return
+
+        if self.pyramid is None or self.pyramid.image is not img:
+            self.pyramid = Pyramid(img)
+        self.imageExtent = extent
+        self.imageSize = w, h
+        self.delete('image')
+        self.tiles = {}
+        self.refresh()
 
         menu.crop.lSizeVisual.config(
             text=f'Visual: {w:>4}×{h:<4}')
-        self._drawImage()
 
-    def _drawImage(self):
-        wCanv, hCanv = self.winfo_width(), self.winfo_height()
-        w, h = self.imageResized.size
-        
-        self.imageExtent = (
-            (wCanv - w) // 2, (hCanv - h) // 2,
-            (wCanv + w) // 2, (hCanv + h) // 2)
-        self.create_image(
-            wCanv // 2, hCanv // 2, anchor='center',
-            image=self.imagetk, tags='image')
+    def refresh(self, box=None):
+        '''
+        Redraw the visible tiles showing a box of image pixels
+        (by default all of it), say after drawing on the image.
+        '''
+        if self.pyramid is None or self.imageSize is None:
+            return
+        img = self.pyramid.image
+        wImag, hImag = img.size
+        w, h = self.imageSize
+        sx, sy = w / wImag, h / hImag
+        if box is None:
+            box = (0, 0, wImag, hImag)
+        else:
+            self.pyramid.update(box)
+
+        # Display pixels showing the box, a pixel more for filtering
+        x1, y1, x2, y2 = box
+        x1, y1 = max(0, int(x1 * sx) - 1), max(0, int(y1 * sy) - 1)
+        x2, y2 = min(w, math.ceil(x2 * sx) + 1), min(h, math.ceil(y2 * sy) + 1)
+
+        # ...that are within the canvas's viewport
+        ex1, ey1, _, _ = self.imageExtent
+        vx1, vy1 = self.canvasx(0) - ex1, self.canvasy(0) - ey1
+        vx2, vy2 = vx1 + self.winfo_width(), vy1 + self.winfo_height()
+        x1, y1 = max(x1, int(vx1)), max(y1, int(vy1))
+        x2, y2 = min(x2, math.ceil(vx2)), min(y2, math.ceil(vy2))
+        if x1 >= x2 or y1 >= y2:
+            return
+
+        _, level = self.pyramid.levelFor(min(sx, sy))
+        fx, fy = level.width / wImag, level.height / hImag
+
+        # Ensure pixels are not blurred
+        method = Image.BILINEAR if sx < 1 else Image.NEAREST
+
+        T = self.TILE
+        for row in range(y1 // T, (y2 - 1) // T + 1):
+            for col in range(x1 // T, (x2 - 1) // T + 1):
+                tx1, ty1 = col * T, row * T
+                tx2, ty2 = min(tx1 + T, w), min(ty1 + T, h)
+                source = (
+                    tx1 / sx * fx, ty1 / sy * fy,
+                    tx2 / sx * fx, ty2 / sy * fy)
+                if method == Image.NEAREST:
+                    tile = nearestTile(level, (tx1, ty1, tx2, ty2), (w, h))
+                else:
+                    tile = level.resize(
+                        (tx2 - tx1, ty2 - ty1), method, box=source)
+                if (col, row) in self.tiles:
+                    self.tiles[col, row].paste(tile)
+                    continue
+                photo = ImageTk.PhotoImage(tile)
+                self.tiles[col, row] = photo
+                self.create_image(
+                    ex1 + tx1, ey1 + ty1, anchor='nw',
+                    image=photo, tags='image')
 
 class xsEditor(tk.Frame):
     def __init__(self, menu):
@@ -252,18 +323,110 @@ class xsInterface(tk.Tk):
 
         self.palette = xstitch.Palette.fromFile('palette.txt')
 
-        # Original as loaded
         self.filepath = None
-        self.imageOrig = None
 
-        # As edited
+        # Versions of the image, first as loaded; None until loaded
+        self.history = None
+        # The version imageEdited shows, and a box drawn on since
+        self.version = None
+        self.dirty = None
+
+        # As edited; draw is None until it may be edited
         self.imageEdited = None
         self.draw = None
 
+        self.worker = Worker(self)
+        self.protocol('WM_DELETE_WINDOW', self.onClose)
+
+        self.bind_all('<Control-z>', lambda e: self.undo())
+        self.bind_all('<Control-y>', lambda e: self.redo())
+        self.bind_all('<Control-Z>', lambda e: self.redo())
+
+    def onClose(self):
+        self.worker.shutdown()
+        self.destroy()
+
     def loadImage(self, fpath):
+        '''Open an image in the background: a quick preview, then in full.'''
         self.filepath = fpath
-        self.imageOrig = Image.open(fpath)
-        self.crop.resetCrop()
+        self.worker.cancel('edit')
+        size = max(self.canvas.winfo_width(), 64), max(self.canvas.winfo_height(), 64)
+
+        def preview():
+            im = Image.open(fpath)
+            # JPEGs decode straight to a fraction of the size
+            im.draft('RGB', size)
+            im.thumbnail(size)
+            return im
+
+        def full():
+            im = Image.open(fpath)
+            im.load()
+            return im
+
+        self.worker.submit('load', preview, full, onResult=self.onImageLoaded)
+
+    def onImageLoaded(self, image, final):
+        # Show it, but don't edit it until its first version is made
+        self.history = self.version = self.dirty = None
+        self.imageEdited = image
+        self.draw = None
+        self.canvas.redraw()
+        if not final:
+            return
+
+        def onTiled(version, final):
+            self.history = History(version)
+            self.version = version
+            # The tiles are copies, so the image itself can be drawn on
+            self.crop.onEditable(image, final)
+
+        self.worker.submit(
+            'edit', lambda: TiledImage.fromImage(image), onResult=onTiled)
+
+    def touch(self, box):
+        '''Note that a box of imageEdited has been drawn on.'''
+        if self.dirty is not None:
+            x1, y1, x2, y2 = self.dirty
+            box = (min(x1, box[0]), min(y1, box[1]), max(x2, box[2]), max(y2, box[3]))
+        self.dirty = box
+
+    def commit(self):
+        '''Record what's been drawn as a new version, copying only its tiles.'''
+        if self.dirty is not None and self.draw is not None:
+            self.version = self.history.push(
+                self.version.withPixels(self.imageEdited, self.dirty))
+        self.dirty = None
+
+    def showVersion(self, version):
+        '''
+        Edit a version from the history. If only some tiles differ from
+        the one shown, just those are pasted and redrawn; otherwise the
+        image is put together again in the background.
+        '''
+        if version is self.version:
+            return
+        boxes = None
+        if self.draw is not None:
+            boxes = version.patch(self.imageEdited, self.version)
+        self.version = version
+        self.dirty = None
+        if boxes is not None:
+            for box in boxes:
+                self.canvas.refresh(box)
+            return
+        self.draw = None
+        self.worker.submit('edit', version.image, onResult=self.crop.onEditable)
+
+    def undo(self):
+        if self.history is not None:
+            self.commit()
+            self.showVersion(self.history.undo())
+
+    def redo(self):
+        if self.history is not None:
+            self.commit()
+            self.showVersion(self.history.redo())
 
 if __name__ == '__main__':
     self = xsInterface()
@@ -24,7 +24,7 @@ def repeat(list_like, length: int) -> list:
     return (ll * math.ceil(length / l))[:length]
 
 class Palette(dict):
-    __slots__ = '_image'.split()
+    __slots__ = '_image _stale'.split()
 
     def _update_palette(self, rgb=None):
         if rgb is None:
@@ -32,6 +32,7 @@ class Palette(dict):
             for r, g, b in self.keys():
                 rgb += [r, g, b]
         self._image.putpalette(repeat(rgb, 256 * 3))
+        self._stale = False
     
     def __init__(self, mapping=None, force_table=None):
         dict.__init__(self, mapping or {})
@@ -43,8 +44,14 @@ class Palette(dict):
                 and all(isinstance(i, int) for i in rgb)):
             raise ValueError('RGB must be tuple(int, int, int)')
         
+        # Colours only matter when quantizing, so rebuild the table then
+        new_colour = rgb not in self
         dict.__setitem__(self, rgb, info)
-        self._update_palette()
+        self._stale = self._stale or new_colour
+
+    def __delitem__(self, rgb):
+        dict.__delitem__(self, rgb)
+        self._stale = True
 
     @classmethod
     def fromFile(cls, file_name):
@@ -56,6 +63,8 @@ class Palette(dict):
         if image.mode not in ("RGB", 'L'):
             raise ValueError(
                 'only RGB or L mode images can be quantized to a palette')
+        if self._stale:
+            self._update_palette()
         im = image.im.convert('P', int(dither), self._image.im)
 
         # Pillow > 4.0 has ._new
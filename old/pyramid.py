@@ -0,0 +1,76 @@
+'''Resolution pyramid, for drawing big images small without resizing all of them.'''
+
+import math
+
+import numpy as np
+from PIL import Image
+
+def nearestTile(image, tile, size):
+    '''
+    The `tile` box of `image` resized to `size` by nearest neighbour.
+
+    Positions are worked out from the whole view, not the tile,
+    so tiles side by side sample exactly as one resize would.
+    '''
+    x1, y1, x2, y2 = tile
+    w, h = size
+    xs = ((np.arange(x1, x2) + 0.5) * (image.width / w)).astype(np.intp)
+    ys = ((np.arange(y1, y2) + 0.5) * (image.height / h)).astype(np.intp)
+    part = image.crop((xs[0], ys[0], xs[-1] + 1, ys[-1] + 1))
+    if part.mode not in ('L', 'P', 'RGB', 'RGBA'):
+        part = part.convert('RGB')
+    pixels = np.asarray(part)[(ys - ys[0])[:, None], xs - xs[0]]
+    out = Image.frombytes(part.mode, (x2 - x1, y2 - y1), pixels.tobytes())
+    if part.mode == 'P':
+        out.putpalette(part.getpalette())
+    return out
+
+class Pyramid:
+    '''
+    An image at full, half, quarter... resolution.
+
+    Each level is half the one before, made lazily with Image.reduce.
+    Downscaled views resample the smallest level still at least twice
+    their size, so cost follows the view, not the image.
+
+    After drawing on the image, update(box) re-reduces just that box.
+    '''
+
+    def __init__(self, image):
+        self.image = image
+        self.levels = [image]
+
+    def _level(self, k):
+        while len(self.levels) <= k:
+            prev = self.levels[-1]
+            if prev.mode not in ('L', 'RGB', 'RGBA'):
+                prev = prev.convert('RGBA' if 'A' in prev.mode else 'RGB')
+            self.levels.append(prev.reduce(2))
+        return self.levels[k]
+
+    def levelFor(self, scale):
+        '''Level k and its image, for drawing at `scale` of full size.'''
+        k = 0
+        if 0 < scale < 1:
+            k = max(0, int(math.log2(1 / scale)) - 1)
+        # No smaller than a pixel
+        while k and min(s >> k for s in self.image.size) < 1:
+            k -= 1
+        return k, self._level(k)
+
+    def update(self, box):
+        '''Redo levels already made, within a box of full-size pixels.'''
+        x1, y1, x2, y2 = box
+        for k in range(1, len(self.levels)):
+            # Whole 2×2 blocks of the level above
+            above = self.levels[k - 1]
+            x1, y1 = x1 // 2 * 2, y1 // 2 * 2
+            x2 = min(-(-x2 // 2) * 2, above.width)
+            y2 = min(-(-y2 // 2) * 2, above.height)
+            if x1 >= x2 or y1 >= y2:
+                return
+            part = above.crop((x1, y1, x2, y2))
+            if part.mode != self.levels[k].mode:
+                part = part.convert(self.levels[k].mode)
+            x1, y1, x2, y2 = x1 // 2, y1 // 2, (x2 + 1) // 2, (y2 + 1) // 2
+            self.levels[k].paste(part.reduce(2), (x1, y1))
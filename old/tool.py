@@ -1,5 +1,6 @@
 '''Toolkit for hotswappable tkinter bindings'''
 import functools
+import time
 
 import tkinter as tk
 
@@ -7,13 +8,53 @@ def attributes(obj):
     for name in dir(obj):
         yield name, getattr(obj, name)
 
-def bind(*sequences, bindToAll=False):
-    '''Bind an event function in a Tool() object, using standard Tk sequences.'''
+def bind(*sequences, bindToAll=False, coalesce=None):
+    '''Bind an event function in a Tool() object, using standard Tk sequences.
+
+    With coalesce=fps, events are collected and the function is called
+    with a list of them, at most fps times a second.'''
     def wrapped(f):
-        f.__binding__ = (bindToAll, sequences)
+        f.__binding__ = (bindToAll, sequences, coalesce)
         return f
     return wrapped
 
+class Coalescer:
+    '''
+    Collects frequent events (such as <B1-Motion>) and hands them on
+    as one list per frame, scheduled with after().
+
+    The next frame waits until 1/fps after the last one finished,
+    so if handling is slow, events pile into fewer, larger batches
+    rather than a backlog.
+    '''
+    def __init__(self, widget, handler, fps=60):
+        self.widget = widget
+        self.handler = handler
+        self.interval = 1 / fps
+        self.events = []
+        self.pending = None
+        self.ready = 0
+
+    def __call__(self, event):
+        self.events.append(event)
+        if self.pending is None:
+            delay = max(0, self.ready - time.monotonic())
+            self.pending = self.widget.after(int(delay * 1000), self.flush)
+
+    def flush(self):
+        '''Handle any events waiting, now.'''
+        self.cancel()
+        events, self.events = self.events, []
+        if events:
+            self.handler(events)
+            self.ready = time.monotonic() + self.interval
+
+    def cancel(self):
+        '''Stop waiting to flush, keeping events collected so far.'''
+        if self.pending is not None:
+            self.widget.after_cancel(self.pending)
+            self.pending = None
+
 class Tool:
     '''
     Base class for a hot-swappable set of bindings for a widget.
@@ -43,7 +84,7 @@ class Tool:
     
     '''
     
-    __slots__ = 'widget bindings'.split()
+    __slots__ = 'widget bindings coalescers _active'.split()
     def __init__(self, widget, active=False):
         '''Create new tool.
 
@@ -60,6 +101,7 @@ class Tool:
         getFunc = lambda name: getattr(type(self), name)
         
         self.bindings = []
+        self.coalescers = []
 
         possible_new_methods = set(dir(self)) - set(dir(Tool))
         
@@ -74,14 +116,31 @@ class Tool:
             if info is None:
                 continue
             
-            bindToAll, sequences = info
+            bindToAll, sequences, fps = info
             func = self.modify_binding(f)
+            if fps:
+                func = Coalescer(self.widget, func, fps)
+                self.coalescers.append(func)
+            else:
+                func = self.flushing(func)
             self.bindings.append((func, bindToAll, sequences))
 
         self._active = False
         if active:
             self.activate()
 
+    def flushing(self, func):
+        '''Handle coalesced events before any other, so order is kept'''
+        @functools.wraps(func)
+        def flushFirst(e):
+            self.flush()
+            return func(e)
+        return flushFirst
+
+    def flush(self):
+        for coalescer in self.coalescers:
+            coalescer.flush()
+
     def modify_binding(self, f):
         '''Modifies unbound f when instantiating tool'''
         @functools.wraps(f)
@@ -103,6 +162,9 @@ class Tool:
         if not self._active:
             return
         self._active = False
+        for coalescer in self.coalescers:
+            coalescer.cancel()
+            coalescer.events.clear()
             
         for func, bindToAll, sequences in self.bindings:
             b = tk.Canvas.unbind_all if bindToAll else self.widget.unbind
@@ -0,0 +1,100 @@
+'''Background jobs for the editor, so the Tk mainloop never waits on them.'''
+
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+class Job:
+    '''Stages run in order on a worker thread, each result passed back to Tk.'''
+    def __init__(self, key, stages, onResult, onError):
+        self.key = key
+        self.stages = stages
+        self.onResult = onResult
+        self.onError = onError
+        self.cancelled = False
+
+    def cancel(self):
+        '''Skip any stages not yet started, and drop all results to come.'''
+        self.cancelled = True
+
+class Worker:
+    '''
+    Runs slow work (decoding, copying, cropping, quantizing) on threads.
+
+    Jobs have a key, such as 'load': a new job supersedes any job with
+    the same key, which is cancelled and its results dropped. A job's
+    stages can go from cheap to thorough, such as a quick preview then
+    the full image, and each result is delivered as it is ready.
+
+    Tk isn't thread-safe, so results wait in a queue that the Tk thread
+    polls with after(), and only while jobs are running.
+    '''
+    def __init__(self, widget, threads=2, poll=15):
+        self.widget = widget
+        self.pool = ThreadPoolExecutor(threads)
+        self.poll = poll
+        self.results = queue.SimpleQueue()
+        self.jobs = {}
+        self.polling = None
+
+    def submit(self, key, *stages, onResult, onError=None):
+        '''
+        Run the stages (functions of no arguments) in order, then call
+        onResult(result, final) on the Tk thread after each.
+        If one raises, onError(exception) is called instead, if given.
+        '''
+        self.cancel(key)
+        job = Job(key, stages, onResult, onError)
+        self.jobs[key] = job
+        self.pool.submit(self._run, job)
+        if self.polling is None:
+            self.polling = self.widget.after(self.poll, self._deliver)
+        return job
+
+    def cancel(self, key):
+        job = self.jobs.pop(key, None)
+        if job is not None:
+            job.cancel()
+
+    def busy(self, *keys):
+        '''Whether any of these jobs (or any at all) are unfinished.'''
+        return any(key in self.jobs for key in keys or self.jobs)
+
+    def _run(self, job):
+        for i, stage in enumerate(job.stages):
+            if job.cancelled:
+                return
+            try:
+                result = stage()
+            except Exception as e:
+                self.results.put((job, i, e, True))
+                return
+            self.results.put((job, i, result, False))
+
+    def _deliver(self):
+        self.polling = None
+        while True:
+            try:
+                job, i, value, failed = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if job.cancelled:
+                continue
+
+            final = failed or i == len(job.stages) - 1
+            if final:
+                del self.jobs[job.key]
+            if not failed:
+                job.onResult(value, final)
+            elif job.onError is not None:
+                job.onError(value)
+            else:
+                self.widget.report_callback_exception(
+                    type(value), value, value.__traceback__)
+
+        if self.jobs:
+            self.polling = self.widget.after(self.poll, self._deliver)
+
+    def shutdown(self):
+        for key in list(self.jobs):
+            self.cancel(key)
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -1,34 +1,125 @@
 "Pixel-and-posterize tool."
 
 from argparse import ArgumentParser
+from functools import partial
+import os
+import sys
 
 from PIL import Image
 
-from .palette import Palette
-from .transformations import *
-
-def transform(args):
-    im = Image.open(args.image)
-    if args.palette:
-        im = posterize(
-            im, Palette.from_file(args.palette))
-    if args.gutter:
-        im = remove_gutter(im, args.gutter)
-    if args.size:
-        im = resize(im, args.size)
-    return im
+from . import chart, materials, packing
+from .batch import expand, output_path, run
+from .cache import DEFAULT_MAX_BYTES, DEFAULT_ROOT
+from .cli import choose_palette, compile_palette, process, transform
+from .dither import METHODS as DITHERS
+from .quantize import METRICS
 
 if __name__ == '__main__':
     parser = ArgumentParser(description=__doc__)
 
     parser.add_argument(
-        'image', help="The path to the image.")
+        'images', nargs='+',
+        help="Paths to images, directories of images, or globs.")
+    parser.add_argument(
+        '--output', '-o', default=None,
+        help="Output directory, or name template using "
+             "{stem}, {name}, {suffix}, {parent} and {index}. "
+             "(default: {stem}-posterity.png, or .npy with --stream)")
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=os.cpu_count(),
+        help="Number of images to process in parallel.")
+    parser.add_argument(
+        '--threads', '-t', type=int, default=1,
+        help="Threads quantizing strips of each image, "
+             "for few large images. Dithering always uses one.")
+    parser.add_argument(
+        '--explain', action='store_true',
+        help="Print the optimized plan for each image, without running it.")
+    parser.add_argument(
+        '--stream', type=int, nargs='?', const=256, default=None, metavar='MB',
+        help="Process in strips using about MB of memory (default 256), "
+             "writing indices to .npy or colours to .ppm. "
+             "Sources must be uint8 .npy or raw images such as .ppm, "
+             "or else fit within MB decoded. "
+             "Can't dither, so needs --dither none, a perceptual --metric "
+             "or --lut with --palette.")
+
+    charts = parser.add_argument_group('charts', 'Printable charts of the result.')
+    charts.add_argument(
+        '--chart', choices=('pdf', 'png', 'svg'), default=None,
+        help="Also write a chart beside each output, as a multi-page PDF, "
+             "numbered PNGs or one SVG. Needs --palette.")
+    charts.add_argument(
+        '--vector', action='store_true',
+        help="Write a PDF chart as one vector page, like SVG, "
+             "rather than rendered pages. Needs --chart pdf or svg.")
+    charts.add_argument(
+        '--chart-style', choices=tuple(chart.STYLES), default='real',
+        help="Real colours with symbols, or black-on-white symbols.")
+    charts.add_argument(
+        '--page', type=int, nargs=2, default=(50, 60), metavar=('COLS', 'ROWS'),
+        help="Cells per chart page. (default: 50 60)")
+    charts.add_argument(
+        '--overlap', type=int, default=2,
+        help="Cells repeated between neighbouring pages. (default: 2)")
+
+    report = parser.add_argument_group('materials', 'How much of each colour.')
+    report.add_argument(
+        '--report', choices=('csv', 'json'), default=None,
+        help="Also write a materials report beside each output. Needs --palette.")
+    report.add_argument(
+        '--materials', choices=tuple(materials.PRESETS), default=None,
+        help="Add the usual units for a craft, such as skeins or bricks.")
+    report.add_argument(
+        '--unit', nargs=2, action='append', default=[],
+        metavar=('NAME', 'PER_CELL'),
+        help="Add a column of NAME, at PER_CELL per cell. Repeatable.")
+    report.add_argument(
+        '--pack', nargs='*', default=None, metavar='WxH',
+        help="Also cover the result with larger parts, such as LEGO plates, "
+             "and write the part list and placements beside each output. "
+             "Needs --palette. "
+             f"(default: {' '.join(packing.DEFAULT_PARTS)})")
 
     tools = parser.add_argument_group('tools', 'Applied in order.')
     
     parser.add_argument(
         '--palette', '-p',
         help="Quantize colors to a palette.txt file.")
+    parser.add_argument(
+        '--colours', '-n', type=int, default=None, metavar='N',
+        help="Use only the N palette colours that best suit each image.")
+    parser.add_argument(
+        '--metric', '-m', choices=METRICS, default='rgb',
+        help="Colour distance used by --palette. "
+             "'lab' and 'ciede2000' are perceptual, "
+             "and dither only with --dither. "
+             "'ciede2000' caches an exact table for images of many colours.")
+    parser.add_argument(
+        '--dither', '-d', choices=('none',) + DITHERS, default=None,
+        help="Dither the resized result. By default only the 'rgb' metric "
+             "dithers, with Pillow's Floyd-Steinberg before resizing.")
+    parser.add_argument(
+        '--lut', type=int, choices=range(4, 9), default=None, metavar='BITS',
+        help="Look colours up in a cached table with BITS per channel; "
+             "8 is exact; with fewer, ambiguous cells are searched exactly, "
+             "which for 'ciede2000' is every cell. "
+             "Dithers only with --dither.")
+    parser.add_argument(
+        '--cache-dir', default=DEFAULT_ROOT,
+        help="Directory for cached tables and results. (default: %(default)s)")
+    parser.add_argument(
+        '--cache-size', type=int, default=DEFAULT_MAX_BYTES >> 20,
+        metavar='MB', help="Evict cached tables and results beyond this size.")
+    parser.add_argument(
+        '--cache-results', action='store_true',
+        help="Cache each image decoded, cropped, resized and posterized, "
+             "keyed by its bytes, the palette and the steps so far, "
+             "so re-runs only redo the steps after what changed.")
+    parser.add_argument(
+        '--full-decode', action='store_true',
+        help="Always decode images at full resolution, "
+             "rather than reduced when resizing small.")
     tools.add_argument(
         '--gutter', '-g', type=int, default=None,
         help="Remove G%% of pixels from all edge.")
@@ -46,5 +137,38 @@ if __name__ == '__main__':
         return args
 
     args = interpret(parser.parse_args())
-    im = transform(args)
-    im.save('foo.png')
\ No newline at end of file
+    if args.colours and args.lut:
+        parser.error("--colours picks each image's palette, so can't share a --lut")
+    if not args.palette and (args.chart or args.report or args.pack is not None):
+        parser.error('--chart, --report and --pack need --palette')
+    if args.vector and args.chart not in ('pdf', 'svg'):
+        parser.error('--vector needs --chart pdf or svg')
+    if args.stream:
+        if args.palette and (args.dither in DITHERS or args.dither is None
+                and args.metric == 'rgb' and not args.lut):
+            parser.error(
+                "--stream can't dither: give --dither none, "
+                "a perceptual --metric or --lut")
+        if args.chart or args.report or args.pack is not None \
+                or args.cache_results:
+            parser.error(
+                "--stream only writes the result, so can't --chart, "
+                "--report, --pack or --cache-results")
+    if args.pack == []:
+        args.pack = packing.DEFAULT_PARTS
+    paths = expand(args.images)
+    if not paths:
+        parser.error('no images found')
+    if args.output is None:
+        args.output = '{stem}-posterity' + ('.npy' if args.stream else '.png')
+    jobs = [(p, output_path(args.output, p, i)) for i, p in enumerate(paths)]
+    posterizer = compile_palette(args)
+    if args.explain:
+        for path in paths:
+            with Image.open(path) as im:
+                steps = transform(im, args, choose_palette(args, posterizer, im))
+                print(f'{path}:\n{steps.explain()}')
+        sys.exit()
+    work = partial(process, args, posterizer)
+    failed = run(work, jobs, args.jobs)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,108 @@
+"Running a transform over many images, in parallel."
+
+import glob
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from PIL import Image
+
+
+def expand(inputs: list[str]) -> list[Path]:
+    "Files, image files within directories, and glob matches, in order."
+    extensions = Image.registered_extensions()
+    paths = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            paths += sorted(
+                p for p in path.iterdir()
+                if p.is_file() and p.suffix.lower() in extensions)
+        elif path.exists() or not glob.has_magic(item):
+            paths.append(path)
+        else:
+            paths += sorted(
+                Path(p) for p in glob.glob(item, recursive=True)
+                if Path(p).is_file())
+    return list(dict.fromkeys(paths))
+
+
+def output_path(template: str, path: Path, index: int) -> Path:
+    """
+    Where to write the output for an input.
+
+    `template` may use {stem}, {name}, {suffix}, {parent} and {index}.
+    If it is a directory, outputs are written there as {stem}.png.
+    """
+    if template.endswith(('/', '\\')) or Path(template).is_dir():
+        template = str(Path(template, '{stem}.png'))
+    return Path(template.format(
+        stem=path.stem, name=path.name, suffix=path.suffix,
+        parent=path.parent, index=index))
+
+
+_work = None
+
+def _init(work):
+    global _work
+    _work = work
+
+def _run(path: Path, out: Path):
+    "Do one job, reporting any failure rather than raising it."
+    try:
+        _work(path, out)
+    except Exception as e:
+        return f'{type(e).__name__}: {e}'
+
+
+def _result(future):
+    "A job's error, including its process dying, or None."
+    try:
+        return future.result()
+    except BrokenProcessPool as e:
+        return f'{type(e).__name__}: {e}'
+
+
+def run(work, jobs: list[tuple[Path, Path]], processes=None, log=sys.stderr):
+    """
+    Call `work(path, out)` for each job, across a pool of processes.
+
+    `work` is sent to each process once, so anything it holds
+    (such as a compiled Posterizer) is not rebuilt per image.
+    It must be importable from a module other than __main__,
+    as processes may be spawned afresh rather than forked.
+
+    Failures are reported and skipped. Returns the failed jobs.
+    If a process dies, jobs it may have been doing are failed too.
+    """
+    failed = []
+    start = time.perf_counter()
+
+    if processes == 1 or len(jobs) <= 1:
+        _init(work)
+        results = (_run(*job) for job in jobs)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(processes, initializer=_init, initargs=(work,))
+        futures = [pool.submit(_run, *job) for job in jobs]
+        results = (_result(future) for future in futures)
+
+    try:
+        for i, ((path, out), error) in enumerate(zip(jobs, results), 1):
+            if error:
+                failed.append((path, out))
+                print(f'[{i}/{len(jobs)}] {path}: {error}', file=log)
+            else:
+                print(f'[{i}/{len(jobs)}] {path} -> {out}', file=log)
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    done = len(jobs) - len(failed)
+    print(
+        f'{done} done, {len(failed)} failed in {elapsed:.2f}s'
+        f' ({done / elapsed if elapsed else 0:.1f} images/s)', file=log)
+    return failed
@@ -0,0 +1,93 @@
+"Time quantizing and dithering an image with each method."
+
+from argparse import ArgumentParser
+import time
+
+import numpy as np
+from PIL import Image
+
+from .dither import METHODS, Ditherer
+from .lut import LUT, REFINE
+from .palette import Palette, PaletteEntry
+from .quantize import METRICS, Posterizer
+
+
+def timed(f, *args, repeat=3):
+    "Best time of a few calls, in seconds."
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def edits(palette: Palette, metric: str, bits: int):
+    """
+    Time patching a LUT for each kind of palette edit, and count
+    the cells where it disagrees with a table built afresh.
+    """
+    posterizer = Posterizer(Palette(palette), metric, dither=Image.Dither.NONE)
+    start = time.perf_counter()
+    posterizer.lut = LUT.build(posterizer, bits)
+    print(f'{"build":>16}: {(time.perf_counter() - start)*1000:8.1f} ms')
+
+    used = {entry.symbol for entry in palette}
+    symbol = next(c for c in map(chr, range(33, 127)) if c not in used)
+    for name, edit in (
+            ('insert', lambda p: p.insert(
+                1, PaletteEntry(symbol, (37, 200, 120), 'Inserted'))),
+            ('recolour', lambda p: p.recolour(symbol, (200, 37, 120))),
+            ('discard', lambda p: p.discard(symbol)),
+            ('append', lambda p: p.add(
+                PaletteEntry(symbol, (120, 37, 200), 'Appended')))):
+        start = time.perf_counter()
+        edit(posterizer.palette)
+        t = time.perf_counter() - start
+        if posterizer.lut is None:
+            print(f'{name:>16}: {t*1000:8.1f} ms, table dropped')
+            continue
+        fresh = LUT.build(Posterizer(
+            Palette(posterizer.palette), metric, dither=Image.Dither.NONE), bits)
+        table = posterizer.lut.table
+        # Patching may leave cells to refine that a build needn't
+        wrong = np.count_nonzero((table != fresh.table) & (table != REFINE))
+        print(f'{name:>16}: {t*1000:8.1f} ms, {wrong} cells wrong')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('image', help="The path to the image.")
+    parser.add_argument('palette', help="A palette.txt file.")
+    parser.add_argument(
+        '--metric', '-m', choices=METRICS, default='lab')
+    parser.add_argument(
+        '--size', '-s', type=int, nargs=2, default=None,
+        help="Resize to width and height first, as a pattern would be.")
+    parser.add_argument(
+        '--edits', type=int, choices=range(4, 9), default=None,
+        metavar='BITS',
+        help="Instead, time patching a LUT with BITS per channel "
+             "for palette edits, checking it against a fresh build.")
+    args = parser.parse_args()
+
+    palette = Palette.from_file(args.palette)
+    if args.edits:
+        print(f'{len(palette)} colours, {args.metric}, {args.edits}-bit LUT')
+        edits(palette, args.metric, args.edits)
+        raise SystemExit
+
+    im = Image.open(args.image).convert('RGB')
+    if args.size:
+        im = im.resize(args.size)
+    posterizer = Posterizer(palette, args.metric, dither=Image.Dither.NONE)
+    w, h = im.size
+    print(f'{w}×{h} pixels, {len(palette)} colours, {args.metric}')
+
+    methods = [('none', posterizer)]
+    if len(palette) <= 256:
+        methods.append(('pillow', Posterizer(palette)))
+    methods += [(m, Ditherer(posterizer, m)) for m in METHODS]
+    for name, quantize in methods:
+        t = timed(quantize, im)
+        print(f'{name:>16}: {t*1000:8.1f} ms {w*h/t/1e6:8.2f} MP/s')
@@ -0,0 +1,105 @@
+"On-disk cache shared across processes and runs."
+
+from contextlib import contextmanager
+import os
+import tempfile
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no locking, so concurrent misses each compute the entry
+    fcntl = None
+
+DEFAULT_ROOT = Path(
+    os.environ.get('POSTERITY_CACHE')
+    or Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache'))
+    / 'posterity')
+DEFAULT_MAX_BYTES = 1 << 30
+
+
+class Cache:
+    """
+    A directory of files named by key, evicted least-recently-used
+    once their total size passes `max_bytes`.
+
+    Files are written to a temporary name and renamed into place,
+    so concurrent processes only ever see complete entries. Those that
+    would compute the same costly entry can take turns with `lock`.
+
+    `hits` and `misses` count this object's lookups.
+    """
+
+    def __init__(self, root=DEFAULT_ROOT, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def get(self, key: str) -> Path | None:
+        "Path of a cached entry, marking it recently used, or None."
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def stats(self) -> str:
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0
+        return f'{self.hits} hits, {self.misses} misses ({rate:.0%} hit rate)'
+
+    @contextmanager
+    def lock(self, key: str):
+        "Hold a lock on an entry, shared with other processes, while in use."
+        if fcntl is None:
+            yield
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / f'.lock-{key}', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def put(self, key: str, write) -> Path:
+        "Store an entry by calling `write(path)` on a temporary path."
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix='.tmp-')
+        os.close(fd)
+        try:
+            write(Path(tmp))
+            os.replace(tmp, self.path(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.evict(keep=key)
+        return self.path(key)
+
+    def evict(self, keep=None):
+        "Remove least recently used entries until within `max_bytes`."
+        entries = []
+        for path in self.root.iterdir():
+            if path.name.startswith(('.tmp-', '.lock-')):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path.name == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
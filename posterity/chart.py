@@ -0,0 +1,223 @@
+"Cross-stitch charts: patterns drawn large, with symbols and a grid."
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageOps
+
+from .palette import Palette
+from .pattern import Pattern
+
+
+def key_colours(palette: Palette, brighten=0.2) -> np.ndarray:
+    "Symbol colours: a little brighter, or darker if already bright enough."
+    rgb = palette.array().astype(int)
+    f = int(255 * brighten)
+    too_bright = (rgb > 255 - f).any(axis=1, keepdims=True)
+    return np.clip(rgb + np.where(too_bright, -f, f), 0, 255).astype(np.uint8)
+
+
+def glyph_atlas(palette: Palette, pixel_size=16) -> np.ndarray:
+    "Each palette symbol drawn once, as an (n, pixel_size, pixel_size) array."
+    atlas = np.empty((len(palette), pixel_size, pixel_size), dtype=np.uint8)
+    centre = pixel_size / 2, pixel_size / 2
+    for i, colour in enumerate(palette):
+        glyph = Image.new('L', (pixel_size, pixel_size), 0)
+        ImageDraw.Draw(glyph).text(centre, colour.symbol, fill=255, anchor='mm')
+        atlas[i] = np.asarray(glyph)
+    return atlas
+
+
+def _grid_lines(
+        mask: np.ndarray, pixel_size: int, grid_width: int,
+        offset=(0, 0), size=None):
+    """
+    Draw grid lines between cells, as ImageDraw.line would, in place.
+    `mask` may be just the part at `offset` of a chart `size` pixels big.
+    """
+    if not grid_width:
+        return
+    h, w = mask.shape
+    ox, oy = offset
+    W, H = size or (w, h)
+    before = (grid_width - 1) // 2
+
+    def lines(o, n, N):
+        # Lines that cover any of pixels o to o + n, relative to o
+        first = max(1, -(-(o + before - grid_width + 1) // pixel_size))
+        for x in range(first * pixel_size, min(N, o + n + before), pixel_size):
+            yield max(0, x - before - o), x - before + grid_width - o
+
+    for x1, x2 in lines(ox, w, W):
+        mask[:, x1:x2] = 255
+    for y1, y2 in lines(oy, h, H):
+        mask[y1:y2] = 255
+
+
+def symbol_mask(
+        pattern: Pattern, pixel_size=16, grid_width=1, atlas=None, box=None):
+    """
+    An 'L' mask of each cell's palette symbol, and grid lines.
+
+    Symbols come from a glyph atlas, gathered for all cells at once.
+    Given a box of cells, only that part of the mask is drawn.
+    """
+    if atlas is None:
+        atlas = glyph_atlas(pattern.palette, pixel_size)
+    x0, y0, x1, y1 = box or (0, 0, *pattern.size)
+    indices = pattern.indices[y0:y1, x0:x1]
+    h, w = indices.shape
+    mask = atlas[indices].transpose(0, 2, 1, 3).reshape(
+        h * pixel_size, w * pixel_size)
+    W, H = pattern.size
+    _grid_lines(
+        mask, pixel_size, grid_width,
+        (x0 * pixel_size, y0 * pixel_size), (W * pixel_size, H * pixel_size))
+    return Image.fromarray(mask)
+
+
+def key_real_colour(
+        pattern: Pattern, pixel_size=16, grid_width=1, atlas=None, box=None):
+    "A chart in real colours, with symbols and grid in a contrasting key."
+    mask = symbol_mask(pattern, pixel_size, grid_width, atlas, box)
+    x0, y0, x1, y1 = box or (0, 0, *pattern.size)
+    indices = pattern.indices[y0:y1, x0:x1]
+    real = Image.fromarray(pattern.palette.array()[indices])
+    key = Image.fromarray(key_colours(pattern.palette)[indices])
+    return Image.composite(
+        key.resize(mask.size, Image.NEAREST),
+        real.resize(mask.size, Image.NEAREST), mask)
+
+
+def key_grid(
+        pattern: Pattern, pixel_size=16, grid_width=2, atlas=None, box=None):
+    "A black-on-white chart of symbols and grid."
+    return ImageOps.invert(
+        symbol_mask(pattern, pixel_size, grid_width, atlas, box))
+
+
+STYLES = {'real': key_real_colour, 'grid': key_grid}
+
+
+class Chart:
+    """
+    A chart image, kept up to date as its pattern is edited.
+
+    Rendering is done once. After cells change, only they and the grid
+    lines over them are drawn again and pasted into `image`.
+    """
+
+    def __init__(
+            self, pattern: Pattern, style='real', pixel_size=16,
+            grid_width=1, atlas=None):
+        self.pattern = pattern
+        self.render = STYLES[style]
+        self.pixel_size = pixel_size
+        self.grid_width = grid_width
+        if atlas is None:
+            atlas = glyph_atlas(pattern.palette, pixel_size)
+        self.atlas = atlas
+        self.image = self.render(pattern, pixel_size, grid_width, atlas)
+
+    def update(self, box=None):
+        """
+        Redraw a box of cells (by default all), after changing their
+        indices in the pattern. Returns the box of chart pixels redrawn.
+        """
+        W, H = self.pattern.size
+        x0, y0, x1, y1 = box or (0, 0, W, H)
+        x0, y0, x1, y1 = max(0, x0), max(0, y0), min(W, x1), min(H, y1)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        box = x0, y0, x1, y1
+        part = self.render(
+            self.pattern, self.pixel_size, self.grid_width, self.atlas, box)
+        p = self.pixel_size
+        self.image.paste(part, (x0 * p, y0 * p))
+        return x0 * p, y0 * p, x1 * p, y1 * p
+
+    def __setitem__(self, key, value):
+        "Set cells as `pattern.indices[key] = value` would, redrawing any that change."
+        indices = self.pattern.indices
+        before = indices[key].copy()
+        indices[key] = value
+        changed = np.zeros(indices.shape, dtype=bool)
+        changed[key] = before != indices[key]
+        ys, xs = np.nonzero(changed)
+        if len(ys):
+            self.update((xs.min(), ys.min(), xs.max() + 1, ys.max() + 1))
+
+
+def page_boxes(size: tuple[int, int], page=(50, 60), overlap=2):
+    "Cell boxes of printable pages, sharing `overlap` cells with neighbours."
+    def starts(n, length):
+        # As few pages as fit, spread evenly so no page is a sliver
+        if n <= length:
+            return [0]
+        pages = -(-(n - overlap) // max(1, length - overlap))
+        return [round(i * (n - length) / (pages - 1)) for i in range(pages)]
+
+    w, h = size
+    return [
+        (x, y, min(x + page[0], w), min(y + page[1], h))
+        for y in starts(h, page[1]) for x in starts(w, page[0])]
+
+
+def numbered(chart: Image, box, pixel_size=16, every=10):
+    "Add a margin numbering the box's columns and rows, 1-based."
+    x0, y0, x1, y1 = box
+    margin = 2 * pixel_size
+    out = Image.new(chart.mode, (
+        chart.width + margin, chart.height + margin), 'white')
+    out.paste(chart, (margin, margin))
+    draw = ImageDraw.Draw(out)
+    fill = 'black' if chart.mode == 'RGB' else 0
+    for x in range(x0, x1):
+        if x == x0 or (x + 1) % every == 0:
+            centre = margin + (x - x0 + 0.5) * pixel_size, margin / 2
+            draw.text(centre, str(x + 1), fill=fill, anchor='mm')
+    for y in range(y0, y1):
+        if y == y0 or (y + 1) % every == 0:
+            centre = margin / 2, margin + (y - y0 + 0.5) * pixel_size
+            draw.text(centre, str(y + 1), fill=fill, anchor='mm')
+    return out
+
+
+def render_pages(
+        pattern: Pattern, page=(50, 60), overlap=2, style='real',
+        pixel_size=16, grid_width=1, threads=4):
+    """
+    Render numbered chart pages, in order, a few at a time in parallel.
+
+    Only `threads` pages are in memory at once, each rendered
+    from its own part of the pattern.
+    """
+    render = STYLES[style]
+    atlas = glyph_atlas(pattern.palette, pixel_size)
+    def work(box):
+        chart = render(pattern.crop(box), pixel_size, grid_width, atlas)
+        return numbered(chart, box, pixel_size)
+
+    boxes = iter(page_boxes(pattern.size, page, overlap))
+    with ThreadPoolExecutor(threads) as pool:
+        pending = deque(pool.submit(work, b) for b in islice(boxes, threads))
+        while pending:
+            yield pending.popleft().result()
+            for box in islice(boxes, 1):
+                pending.append(pool.submit(work, box))
+
+
+def save_pages(pages, path: Path, dpi=150):
+    """
+    Write pages as they arrive: appended to a PDF,
+    or otherwise as numbered files such as chart-001.png.
+    """
+    path = Path(path)
+    for i, page in enumerate(pages, 1):
+        if path.suffix.lower() == '.pdf':
+            page.save(path, resolution=dpi, append=i > 1)
+        else:
+            page.save(path.with_stem(f'{path.stem}-{i:03}'))
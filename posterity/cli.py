@@ -0,0 +1,110 @@
+"""
+The command line's work per image, in a module of its own so that
+worker processes can import it (they never import __main__).
+"""
+
+import sys
+
+from PIL import Image
+
+from . import chart, materials, packing, subset, vector
+from .cache import Cache
+from .dither import METHODS as DITHERS, Ditherer
+from .lut import LUT
+from .palette import Palette
+from .pattern import Pattern
+from .pipeline import file_digest, plan
+from .quantize import Posterizer
+from .stream import open_array, stream
+
+
+def compile_palette(args, palette=None):
+    """
+    The Posterizer for --palette, built once per run.
+
+    With --colours, only the catalogue is loaded here;
+    each image then has its own Posterizer, from `choose_palette`.
+    Those are used once, so aren't given tables to cache.
+    """
+    if not args.palette:
+        return None
+    whole = palette is None
+    if whole:
+        palette = Palette.from_file(args.palette)
+        if args.colours and args.colours < len(palette):
+            return palette
+    posterizer = Posterizer(
+        palette, args.metric,
+        dither=Image.Dither.NONE if args.dither else Image.Dither.FLOYDSTEINBERG,
+        threads=args.threads)
+    if whole:
+        posterizer.cache = Cache(args.cache_dir, args.cache_size << 20)
+    if args.lut:
+        posterizer.lut = LUT.load(posterizer, args.lut, posterizer.cache)
+    elif whole and args.metric == 'ciede2000' \
+            and posterizer.cache.get(LUT.key(posterizer, 8)):
+        # Map the automatic table once here, not in every worker. Uncached,
+        # the first worker to want it builds it while the others wait
+        posterizer.lut = LUT.load(posterizer, 8, posterizer.cache)
+    if args.dither in DITHERS:
+        return Ditherer(posterizer, args.dither)
+    return posterizer
+
+
+def choose_palette(args, posterizer, src):
+    "Pick this image's colours if --colours asks, otherwise as compiled."
+    if isinstance(posterizer, Palette):
+        return compile_palette(args, subset.choose(posterizer, src, args.colours))
+    return posterizer
+
+
+def transform(im, args, posterizer=None):
+    "The optimized plan of tools for an image."
+    return plan(im, posterizer, args.gutter, args.size, not args.full_decode)
+
+
+def process(args, posterizer, path, out):
+    if args.stream:
+        out.parent.mkdir(parents=True, exist_ok=True)
+        src = open_array(path, args.stream << 20)
+        stream(
+            src, out, choose_palette(args, posterizer, src),
+            args.gutter, args.size, args.stream << 20)
+        return
+    im = Image.open(path)
+    posterizer = choose_palette(args, posterizer, im)
+    steps = transform(im, args, posterizer)
+    if args.cache_results:
+        cache = Cache(args.cache_dir, args.cache_size << 20)
+        im = steps.cached(
+            im, file_digest(path), cache,
+            posterizer.palette if posterizer else None)
+        print(
+            f'{path}: reused {steps.reused} of {len(steps.stages())} stages; '
+            f'cache {cache.stats()}', file=sys.stderr)
+    else:
+        im = steps(im)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    im.save(out)
+    if (args.chart or args.report or args.pack) and posterizer and not isinstance(im, Pattern):
+        im = Pattern.from_image(im, posterizer.palette)
+    if args.report and posterizer:
+        units = materials.PRESETS.get(args.materials, ()) + tuple(
+            materials.Unit(name, float(per_cell), False)
+            for name, per_cell in args.unit)
+        materials.save(
+            materials.report(im, units),
+            out.with_name(f'{out.stem}-materials.{args.report}'))
+    if args.pack and posterizer:
+        packed = packing.pack(im, args.pack)
+        packed.save(out.with_name(f'{out.stem}-parts.csv'))
+        print(f'{path}: {packed.summary()}', file=sys.stderr)
+    if args.chart and posterizer:
+        path = out.with_name(f'{out.stem}-chart.{args.chart}')
+        if args.vector or args.chart == 'svg':
+            vector.save(im, path, args.chart_style)
+            return
+        pages = chart.render_pages(
+            im, args.page, args.overlap, args.chart_style,
+            threads=args.threads)
+        chart.save_pages(pages, path)
@@ -0,0 +1,197 @@
+"""
+Dithering for any Posterizer, including perceptual and large palettes.
+
+Ordered dithering offsets every pixel by a tiled threshold map at once.
+Error diffusion runs along anti-diagonal wavefronts: every pixel of one
+wavefront has received all its error already, so each is a single
+vectorized step, and a whole image takes about w + 2h of them.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+from .pattern import Pattern
+from .quantize import Posterizer, rgb_array, unique_colours, unpack
+
+# Error diffusion kernels: (dy, dx, weight) to spread each pixel's error
+KERNELS = {
+    'floyd-steinberg': [
+        (0, 1, 7/16),
+        (1, -1, 3/16), (1, 0, 5/16), (1, 1, 1/16)],
+    'atkinson': [
+        (0, 1, 1/8), (0, 2, 1/8),
+        (1, -1, 1/8), (1, 0, 1/8), (1, 1, 1/8),
+        (2, 0, 1/8)],
+    'jarvis': [
+        (0, 1, 7/48), (0, 2, 5/48),
+        (1, -2, 3/48), (1, -1, 5/48), (1, 0, 7/48), (1, 1, 5/48), (1, 2, 3/48),
+        (2, -2, 1/48), (2, -1, 3/48), (2, 0, 5/48), (2, 1, 3/48), (2, 2, 1/48)],
+}
+ORDERED = ('bayer', 'blue-noise')
+METHODS = ORDERED + tuple(KERNELS)
+
+
+@lru_cache
+def bayer(n=8) -> np.ndarray:
+    "An n×n Bayer matrix of thresholds in [0, 1), for n a power of 2."
+    m = np.zeros((1, 1))
+    while len(m) < n:
+        m = np.block([[4*m, 4*m + 2], [4*m + 3, 4*m + 1]])
+    return m / m.size
+
+
+@lru_cache
+def blue_noise(n=64, sigma=1.5, seed=0) -> np.ndarray:
+    "An n×n blue noise threshold map in [0, 1), by void-and-cluster."
+    rng = np.random.default_rng(seed)
+    d = np.minimum(np.arange(n), n - np.arange(n))
+    gauss = np.exp(-(d[:, None]**2 + d[None, :]**2) / (2 * sigma**2))
+
+    def splat(energy, y, x, sign):
+        energy += sign * np.roll(gauss, (y, x), axis=(0, 1))
+
+    def extreme(energy, mask, pick):
+        flat = np.where(mask, energy, np.inf if pick is np.argmin else -np.inf)
+        return divmod(int(pick(flat)), n)
+
+    # Initial pattern, relaxed by moving tightest clusters into largest voids
+    points = np.zeros((n, n), dtype=bool)
+    points.flat[rng.choice(n * n, n * n // 10, replace=False)] = True
+    energy = np.zeros((n, n))
+    for y, x in zip(*np.nonzero(points)):
+        splat(energy, y, x, 1)
+    while True:
+        cluster = extreme(energy, points, np.argmax)
+        points[cluster] = False
+        splat(energy, *cluster, -1)
+        void = extreme(energy, ~points, np.argmin)
+        points[void] = True
+        splat(energy, *void, 1)
+        if void == cluster:
+            break
+
+    rank = np.zeros((n, n))
+    ones = int(points.sum())
+    # Rank the initial points by removing clusters...
+    remaining, e = points.copy(), energy.copy()
+    for r in range(ones - 1, -1, -1):
+        cluster = extreme(e, remaining, np.argmax)
+        remaining[cluster] = False
+        splat(e, *cluster, -1)
+        rank[cluster] = r
+    # ...then the rest by filling voids
+    for r in range(ones, n * n):
+        void = extreme(energy, ~points, np.argmin)
+        points[void] = True
+        splat(energy, *void, 1)
+        rank[void] = r
+    return rank / (n * n)
+
+
+def _spread(rgb: np.ndarray) -> float:
+    "Typical distance between neighbouring palette colours."
+    if len(rgb) < 2:
+        return 0.0
+    rgb = rgb.astype(np.float64)
+    dist = np.linalg.norm(rgb[:, None] - rgb[None, :], axis=-1)
+    np.fill_diagonal(dist, np.inf)
+    return float(np.median(dist.min(axis=1)))
+
+
+class Ditherer:
+    """
+    A Posterizer with dithering, used in its place.
+
+    Dithering is meant for the final grid, so pipelines apply it after
+    resizing. The posterizer's own (Pillow) dithering is not used.
+    """
+
+    pointwise = False
+    after_resize = True
+
+    def __init__(self, posterizer: Posterizer, method='floyd-steinberg'):
+        if method not in METHODS:
+            raise ValueError('Unknown dithering method', method)
+        self.posterizer = posterizer
+        self.method = method
+        self.palette = posterizer.palette
+        self.metric = posterizer.metric
+        self._rgb = posterizer.palette.array()
+        self._spread = _spread(self._rgb)
+        self.palette.listen(self._changed)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.palette.listen(self._changed)
+
+    def _changed(self, change):
+        self._rgb = self.palette.array()
+        self._spread = _spread(self._rgb)
+
+    @property
+    def dithering(self):
+        return self.method
+
+    @property
+    def key(self) -> str:
+        lut = self.posterizer.lut
+        match = f'lut {lut.bits}' if lut is not None else 'search'
+        return f'{self.metric} {self.method} {match}'
+
+    def _nearest(self, rgb: np.ndarray) -> np.ndarray:
+        lut = self.posterizer.lut
+        return lut.lookup(rgb) if lut is not None else \
+            self.posterizer.nearest(rgb)
+
+    def _ordered(self, rgb: np.ndarray) -> np.ndarray:
+        h, w, _ = rgb.shape
+        matrix = bayer() if self.method == 'bayer' else blue_noise()
+        n = len(matrix)
+        threshold = np.tile(matrix - 0.5, (-(-h // n), -(-w // n)))[:h, :w]
+        offset = (threshold * self._spread)[..., None]
+        shifted = np.clip(rgb + offset, 0, 255).round().astype(np.uint8)
+        uniq, inverse = unique_colours(shifted.reshape(-1, 3))
+        near = self._nearest(unpack(uniq)).astype(np.uint16)
+        return inverse(near).reshape(h, w)
+
+    def _diffuse(self, rgb: np.ndarray) -> np.ndarray:
+        kernel = KERNELS[self.method]
+        h, w, _ = rgb.shape
+        # Wavefront t = x + k*y, with k steep enough that every pixel
+        # a kernel feeds is on a later wavefront than its source
+        k = max([1] + [-dx // dy + 1 for dy, dx, _ in kernel if dy])
+        pad = max(abs(dx) for _, dx, _ in kernel)
+        depth = max(dy for dy, _, _ in kernel)
+
+        buf = np.zeros((h + depth, w + 2 * pad, 3), dtype=np.float32)
+        buf[:h, pad:pad+w] = rgb
+        out = np.empty((h, w), dtype=np.uint16)
+        palette = self._rgb.astype(np.float32)
+
+        for t in range(w + k * (h - 1)):
+            y = np.arange(max(0, -(-(t - w + 1) // k)), min(h - 1, t // k) + 1)
+            x = t - k * y
+            colour = np.clip(buf[y, x + pad], 0, 255)
+            index = self._nearest(colour.round().astype(np.uint8))
+            out[y, x] = index
+            error = colour - palette[index]
+            for dy, dx, weight in kernel:
+                buf[y + dy, x + dx + pad] += weight * error
+        return out
+
+    def indices(self, im: Image) -> np.ndarray:
+        "Dithered palette index of every pixel, as an (h, w) uint16 array."
+        rgb = rgb_array(im)
+        if self.method in ORDERED:
+            return self._ordered(rgb)
+        return self._diffuse(rgb)
+
+    def pattern(self, im: Image) -> Pattern:
+        return Pattern(self.indices(im), self.palette)
+
+    def __call__(self, im: Image):
+        "Dither to a 'P' image, or to a Pattern if over 256 colours."
+        pattern = self.pattern(im)
+        return pattern if len(self.palette) > 256 else pattern.image()
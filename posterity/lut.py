@@ -0,0 +1,234 @@
+"Colour lookup tables: nearest palette index for every 24-bit colour."
+
+import hashlib
+
+import numpy as np
+
+from .cache import Cache
+from .colour import srgb_to_lab
+from .palette import Change
+from .quantize import Posterizer, unique_colours, unpack
+
+# Grid cells whose colours don't all share a nearest entry
+REFINE = np.iinfo(np.uint16).max
+# Blocks per channel that patching bounds its search by
+BLOCKS = 32
+# Table cells patched at once
+CHUNK = 1 << 18
+# Relative slack for float rounding when bounding distances
+TOLERANCE = 1e-4
+
+
+def _grid_colours(values: np.ndarray) -> np.ndarray:
+    "Every (r, g, b) combination of the given channel values."
+    r, g, b = np.meshgrid(values, values, values, indexing='ij')
+    return np.stack((r, g, b), axis=-1).reshape(-1, 3).astype(np.uint8)
+
+
+class LUT:
+    """
+    A 3D table of nearest palette indices, with `bits` per channel.
+
+    At 8 bits it covers all 16M colours exactly and quantizing is a
+    single gather. Fewer bits give a coarse grid: cells whose corners
+    all share a nearest entry store it, and the rest are marked REFINE
+    and searched exactly on lookup. That relies on the colours nearest
+    each entry filling a convex region, as they do in RGB and CIELAB.
+    They needn't for CIEDE2000, so its coarse cells are all REFINE:
+    only an 8-bit table saves any work there.
+
+    Tables are memory-mapped from a Cache, keyed by the palette's colours,
+    metric and bits, so they are built once and shared between processes.
+    A palette edit patches the table in memory, as in `patch`,
+    except for CIEDE2000.
+    """
+
+    def __init__(self, table: np.ndarray, posterizer: Posterizer):
+        self.table = table
+        self.bits = int(round(np.log2(table.shape[0])))
+        self.posterizer = posterizer
+
+    @staticmethod
+    def key(posterizer: Posterizer, bits: int) -> str:
+        digest = hashlib.sha256(posterizer.palette.array().tobytes())
+        return f'lut-{posterizer.metric}-{bits}-{digest.hexdigest()[:32]}.npy'
+
+    @classmethod
+    def build(cls, posterizer: Posterizer, bits=8, out=None):
+        "Compute a table, into `out` if given."
+        n = 1 << bits
+        if out is None:
+            out = np.empty((n, n, n), dtype=np.uint16)
+        step = 1 << (8 - bits)
+
+        if bits == 8:
+            # One red slice at a time keeps the working set small
+            gb = _grid_colours(np.arange(n))[:n*n]
+            for r in range(n):
+                gb[:, 0] = r
+                out[r] = posterizer.nearest(gb).reshape(n, n)
+            return cls(out, posterizer)
+
+        if posterizer.metric == 'ciede2000':
+            out[...] = REFINE
+            return cls(out, posterizer)
+
+        # Nearest at both extremes of each cell along every channel
+        edges = np.stack((
+            np.arange(n) * step, np.arange(n) * step + step - 1), axis=-1)
+        corners = posterizer.nearest(_grid_colours(edges.ravel()))
+        corners = corners.reshape(n, 2, n, 2, n, 2)
+        first = corners[:, 0, :, 0, :, 0]
+        uniform = (corners == first[:, None, :, None, :, None]).all(
+            axis=(1, 3, 5))
+        out[...] = np.where(uniform, first, REFINE)
+        return cls(out, posterizer)
+
+    @classmethod
+    def load(cls, posterizer: Posterizer, bits=8, cache: Cache = None):
+        "Fetch a table from the cache, building and storing it if missing."
+        cache = cache or Cache()
+        key = cls.key(posterizer, bits)
+        path = cache.get(key)
+        if path is None:
+            # One process builds it; any others wanting it wait, then load
+            with cache.lock(key):
+                path = cache.path(key)
+                if not path.exists():
+                    n = 1 << bits
+                    def write(path):
+                        out = np.lib.format.open_memmap(
+                            path, mode='w+', dtype=np.uint16, shape=(n, n, n))
+                        cls.build(posterizer, bits, out)
+                        out.flush()
+                    path = cache.put(key, write)
+        return cls(np.load(path, mmap_mode='r'), posterizer)
+
+    def _corners(self, cells: np.ndarray) -> np.ndarray:
+        "The colours at the corners of each (r, g, b) cell, as (m, k, 3)."
+        step = 1 << (8 - self.bits)
+        ends = [0] if step == 1 else [0, step - 1]
+        offsets = _grid_colours(np.array(ends))
+        return (cells[:, None] * step + offsets).astype(np.uint8)
+
+    def _resolve(self, cells: np.ndarray) -> np.ndarray:
+        "Cells' entries worked out afresh, as `build` does."
+        corners = self._corners(cells)
+        m, k, _ = corners.shape
+        near = self.posterizer.nearest(corners.reshape(-1, 3)).reshape(m, k)
+        return np.where((near == near[:, :1]).all(axis=1), near[:, 0], REFINE)
+
+    def _blocks(self):
+        """
+        The table split into blocks of cells, up to BLOCKS per channel:
+        their first cells, and bounds on their colours in the metric's
+        space (RGB or CIELAB), as (lower, upper) pairs of (m, 3) arrays.
+        """
+        n = len(self.table)
+        blocks = min(n, BLOCKS)
+        span = 256 // blocks
+        lo = _grid_colours(np.arange(blocks) * span)
+        hi = _grid_colours(np.arange(blocks) * span + span - 1)
+        first = lo.astype(np.intp) >> (8 - self.bits)
+        if self.posterizer.metric == 'rgb':
+            return first, lo.astype(np.float32), hi.astype(np.float32)
+        # X, Y and Z grow with each channel, so a block's extremes
+        # are at its corners; a* and b* are differences of them
+        (L0, a0, b0), (L1, a1, b1) = (
+            np.moveaxis(srgb_to_lab(c), -1, 0) for c in (lo, hi))
+        fy0, fy1 = (L0 + 16) / 116, (L1 + 16) / 116
+        fx0, fx1 = fy0 + a0 / 500, fy1 + a1 / 500
+        fz0, fz1 = fy0 - b0 / 200, fy1 - b1 / 200
+        lower = np.stack((L0, 500 * (fx0 - fy1), 200 * (fy0 - fz1)), axis=-1)
+        upper = np.stack((L1, 500 * (fx1 - fy0), 200 * (fy1 - fz0)), axis=-1)
+        return first, lower, upper
+
+    def _reachable(self, i: int) -> np.ndarray:
+        """
+        Cells entry `i` may be nearest for some colour of: those in
+        blocks it could be nearer to than some entry is to all of them.
+        """
+        first, lower, upper = self._blocks()
+        rgb = self.posterizer.palette.array()
+        points = rgb.astype(np.float32) if self.posterizer.metric == 'rgb' \
+            else srgb_to_lab(rgb)
+        near = (np.maximum(np.maximum(lower - points[i], points[i] - upper), 0)
+            ** 2).sum(axis=1)
+        reach = np.full(len(first), np.inf, dtype=near.dtype)
+        for j, point in enumerate(points):
+            if j != i:
+                far = np.maximum((point - lower) ** 2, (point - upper) ** 2)
+                np.minimum(reach, far.sum(axis=1), out=reach)
+        first = first[near <= reach * (1 + TOLERANCE) + TOLERANCE]
+        side = len(self.table) // min(len(self.table), BLOCKS)
+        offsets = _grid_colours(np.arange(side)).astype(np.intp)
+        return (first[:, None] + offsets).reshape(-1, 3)
+
+    def patch(self, change: Change):
+        """
+        Update the table for one palette edit, with the posterizer
+        already patched. Only cells that may change are searched:
+        those of a removed or recoloured entry, and for a new colour,
+        those in blocks of colour space it could win, whose corners
+        are nearer (or nearly) to it than to their entry. Cells already
+        marked REFINE stay so, which is always safe.
+
+        CIEDE2000 only compares each colour's nearest candidates in
+        CIELAB, so an edit can change cells it is not nearest to;
+        Posterizers drop its tables rather than patch them.
+        """
+        if not self.table.flags.writeable:
+            self.table = np.array(self.table)
+        table = self.table
+        i, old, new = change
+        if old is None and i < len(self.posterizer.palette) - 1:
+            # Inserted: later entries move up one index
+            table[(table >= i) & (table != REFINE)] += 1
+        if old is not None:
+            hit = np.argwhere(table == i)
+            if new is None:
+                table[(table > i) & (table != REFINE)] -= 1
+            table[tuple(hit.T)] = self._resolve(hit)
+        if new is None:
+            return
+
+        cells = self._reachable(i)
+        for start in range(0, len(cells), CHUNK):
+            chunk = cells[start:start+CHUNK]
+            current = table[tuple(chunk.T)]
+            keep = (current != REFINE) & (current != i)
+            chunk, current = chunk[keep], current[keep].astype(np.intp)
+            corners = self._corners(chunk)
+            m, k, _ = corners.shape
+            colours = corners.reshape(-1, 3)
+            d_new = self.posterizer.distance(colours, i).reshape(m, k)
+            d_old = self.posterizer.distance(
+                colours, np.repeat(current, k)).reshape(m, k)
+            # Near ties are settled by searching, exactly as `build` does
+            close = (d_new <= d_old * (1 + TOLERANCE) + TOLERANCE).any(axis=1)
+            chunk = chunk[close]
+            table[tuple(chunk.T)] = self._resolve(chunk)
+
+    def __getstate__(self):
+        # Processes share a cached table by mapping the same file
+        state = self.__dict__.copy()
+        if isinstance(self.table, np.memmap):
+            state['table'] = self.table.filename
+        return state
+
+    def __setstate__(self, state):
+        if isinstance(state['table'], str):
+            state['table'] = np.load(state['table'], mmap_mode='r')
+        self.__dict__.update(state)
+
+    def lookup(self, rgb: np.ndarray) -> np.ndarray:
+        "Nearest palette index for each colour of an (n, 3) uint8 array."
+        shift = 8 - self.bits
+        cell = rgb >> shift if shift else rgb
+        out = self.table[cell[:, 0], cell[:, 1], cell[:, 2]]
+        if shift:
+            refine = np.flatnonzero(out == REFINE)
+            if len(refine):
+                uniq, inverse = unique_colours(rgb[refine])
+                out[refine] = inverse(self.posterizer.nearest(unpack(uniq)))
+        return out
@@ -0,0 +1,69 @@
+"""
+Materials: how much of each colour a pattern needs.
+
+Counting is one `bincount` over the pattern's indices,
+so a report costs about as much as reading the pattern once.
+"""
+
+import csv
+import json
+from collections import namedtuple
+from math import ceil
+from pathlib import Path
+
+import numpy as np
+
+from .pattern import Pattern
+
+# An amount per cell; whole units (skeins, bricks) are rounded up per colour
+Unit = namedtuple('Unit', ('name', 'per_cell', 'whole'))
+
+PRESETS = {
+    # Two strands, full crosses on 14-count; a skein is 8m of six strands
+    'cross-stitch': (Unit('metres', 0.045, False), Unit('skeins', 0.045 / 24, True)),
+    'diamond': (Unit('drills', 1, True), Unit('bags', 1 / 200, True)),
+    # One 1×1 plate per cell, or a third of a 1×1 brick
+    'lego': (Unit('plates', 1, True), Unit('bricks', 1 / 3, True)),
+}
+
+
+def counts(pattern: Pattern) -> np.ndarray:
+    "The number of cells of each palette colour, as an (n,) array."
+    return np.bincount(pattern.indices.ravel(), minlength=len(pattern.palette))
+
+
+def report(pattern: Pattern, units=(), unused=False) -> list[dict]:
+    """
+    A row per palette colour: its symbol, name, colour, cell count,
+    share of the pattern and the amount in each unit. Most used first.
+    """
+    n = counts(pattern)
+    total = max(1, int(n.sum()))
+    rows = []
+    for i in np.argsort(-n, kind='stable'):
+        if not n[i] and not unused:
+            continue
+        entry = pattern.palette.entry(i)
+        row = {
+            'symbol': entry.symbol, 'name': entry.name,
+            'rgb': '#%02x%02x%02x' % tuple(entry.rgb),
+            'cells': int(n[i]), 'share': round(int(n[i]) / total, 6)}
+        for unit in units:
+            amount = n[i] * unit.per_cell
+            row[unit.name] = ceil(amount) if unit.whole else round(float(amount), 3)
+        rows.append(row)
+    return rows
+
+
+def save(rows: list[dict], path: Path):
+    "Write a report as .csv or .json, by the path's suffix."
+    path = Path(path)
+    if path.suffix.lower() == '.json':
+        path.write_text(json.dumps(rows, indent=1, ensure_ascii=False))
+    elif path.suffix.lower() == '.csv':
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else [])
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        raise ValueError('Reports must be .csv or .json', path)
@@ -0,0 +1,143 @@
+"""
+Packing: covering a pattern with larger parts, such as LEGO plates.
+
+Parts are placed largest first. For each part and orientation, the
+grid is split into its w×h lattice at each of w·h offsets, and within
+one offset every lattice cell that fits is placed at once, since those
+can never overlap. Each of these phases is a few whole-array steps,
+so packing costs about (phases × cells), whatever the pattern.
+"""
+
+import csv
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from .pattern import Pattern
+
+Part = namedtuple('Part', ('w', 'h'))
+DEFAULT_PARTS = ('2x4', '2x3', '2x2', '1x4', '1x3', '1x2')
+
+
+def parse_part(text: str) -> Part:
+    "Interpret e.g. `2x4`."
+    w, h = map(int, text.lower().split('x'))
+    if w < 1 or h < 1:
+        raise ValueError('Parts must be at least 1×1', text)
+    return Part(min(w, h), max(w, h))
+
+
+class Packing:
+    """
+    Parts covering every cell of a pattern exactly once.
+
+    `placements` holds a row of (x, y, w, h, colour) per part,
+    and `map` the number of the placement covering each cell.
+    """
+
+    def __init__(self, pattern: Pattern, placements: np.ndarray, seconds: float):
+        self.pattern = pattern
+        self.placements = placements
+        self.seconds = seconds
+        h, w = pattern.indices.shape
+        self.map = np.empty((h, w), dtype=np.int32)
+        number = np.arange(len(placements), dtype=np.int32)
+        for pw, ph in np.unique(placements[:, 2:4], axis=0):
+            same = (placements[:, 2] == pw) & (placements[:, 3] == ph)
+            x, y = placements[same, 0], placements[same, 1]
+            for dy in range(ph):
+                for dx in range(pw):
+                    self.map[y + dy, x + dx] = number[same]
+
+    def __len__(self):
+        return len(self.placements)
+
+    def parts(self) -> list[dict]:
+        "How many of each part in each colour, most first."
+        entries = list(self.pattern.palette)
+        w, h = self.placements[:, 2], self.placements[:, 3]
+        kinds, count = np.unique(
+            np.stack([np.minimum(w, h), np.maximum(w, h), self.placements[:, 4]], 1),
+            axis=0, return_counts=True)
+        rows = [
+            {'part': f'{pw}x{ph}', 'symbol': entries[c].symbol,
+             'name': entries[c].name, 'count': int(n)}
+            for (pw, ph, c), n in zip(kinds, count)]
+        return sorted(rows, key=lambda row: -row['count'])
+
+    def summary(self) -> str:
+        cells = self.pattern.indices.size
+        return (
+            f'{len(self)} parts for {cells} cells '
+            f'({len(self) / max(1, cells):.1%}) in {self.seconds:.3f}s')
+
+    def save(self, path: Path):
+        "Write the part list, then the placements, as .csv."
+        entries = list(self.pattern.palette)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(('part', 'symbol', 'name', 'count'))
+            writer.writerows(row.values() for row in self.parts())
+            writer.writerow(())
+            writer.writerow(('x', 'y', 'w', 'h', 'symbol'))
+            writer.writerows(
+                (x, y, w, h, entries[c].symbol)
+                for x, y, w, h, c in self.placements.tolist())
+
+
+def _run_lengths(key: np.ndarray) -> np.ndarray:
+    "How many equal cells run rightwards from each cell; 0 where key < 0."
+    h, w = key.shape
+    x = np.arange(w)
+    end = np.ones((h, w), dtype=bool)
+    end[:, :-1] = key[:, 1:] != key[:, :-1]
+    ends = np.where(end, x, w)
+    ends = np.minimum.accumulate(ends[:, ::-1], axis=1)[:, ::-1]
+    return np.where(key >= 0, ends - x + 1, 0)
+
+
+def _fits(key: np.ndarray, w: int, h: int) -> np.ndarray:
+    "Where a w×h part fits with its top-left corner, all one free colour."
+    rows, cols = key.shape
+    fit = np.zeros_like(key, dtype=bool)
+    if w > cols or h > rows:
+        return fit
+    run = _run_lengths(key)
+    ok = run[:rows - h + 1] >= w
+    for j in range(1, h):
+        below = slice(j, rows - h + 1 + j)
+        ok &= (run[below] >= w) & (key[below] == key[:rows - h + 1])
+    fit[:rows - h + 1] = ok
+    return fit
+
+
+def pack(pattern: Pattern, parts=DEFAULT_PARTS) -> Packing:
+    "Cover a pattern with parts, largest first, filling in with 1×1s."
+    start = time.perf_counter()
+    parts = sorted(
+        {parse_part(p) if isinstance(p, str) else Part(*p) for p in parts},
+        key=lambda p: (-p.w * p.h, -p.h))
+    key = pattern.indices.astype(np.int32)
+    placed = []
+    for part in parts:
+        for w, h in dict.fromkeys([(part.w, part.h), (part.h, part.w)]):
+            for oy in range(h):
+                for ox in range(w):
+                    fit = _fits(key, w, h)
+                    ys, xs = np.nonzero(fit[oy::h, ox::w])
+                    if not len(ys):
+                        continue
+                    ys, xs = ys * h + oy, xs * w + ox
+                    placed.append(np.stack([
+                        xs, ys, np.full_like(xs, w), np.full_like(xs, h),
+                        key[ys, xs]], axis=1))
+                    for dy in range(h):
+                        for dx in range(w):
+                            key[ys + dy, xs + dx] = -1
+    ys, xs = np.nonzero(key >= 0)
+    ones = np.ones_like(xs)
+    placed.append(np.stack([xs, ys, ones, ones, key[ys, xs]], axis=1))
+    placements = np.concatenate(placed).astype(np.int32)
+    return Packing(pattern, placements, time.perf_counter() - start)
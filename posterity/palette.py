@@ -1,14 +1,93 @@
 "Palette interpreter."
 
+import weakref
 from collections import namedtuple
 from pathlib import Path
 
+import numpy as np
 from PIL import Image
 
 
-PaletteEntry = namedtuple('Color', ('symbol', 'rgb', 'name'))
+class PaletteEntry(namedtuple('PaletteEntry', ('symbol', 'rgb', 'name'))):
+    "A colour: its chart symbol, (r, g, b) tuple and name."
+    __slots__ = ()
+
+    def __new__(cls, symbol: str, rgb, name: str):
+        return super().__new__(cls, symbol, tuple(map(int, rgb)), name)
+
+# An edit at `index`: `old` is None for an addition, `new` for a removal
+Change = namedtuple('Change', ('index', 'old', 'new'))
 
 class Palette(list[PaletteEntry]):
+    """
+    Palette entries, in order.
+
+    Entries are indexed by symbol, colour and name, so looking one up
+    takes constant time. Symbols must be unique; a colour or name
+    shared by several entries finds the first.
+
+    Edit with `add`, `discard` and `recolour`, or the list methods,
+    which keep the indexes,
+    colour array and image up to date and tell anything listening
+    (such as a compiled Posterizer) what changed, so it can patch
+    rather than rebuild. Listeners that are methods are held weakly,
+    so listening doesn't keep a Posterizer alive.
+    """
+
+    def __init__(self, entries=()):
+        super().__init__(entries)
+        self.version = 0
+        self._listeners = []
+        self._array = None
+        self._image = None
+        self._reindex()
+
+    def __reduce__(self):
+        # Without listeners, which rebind on their own unpickling
+        return type(self), (list(self),)
+
+    def _reindex(self):
+        "Index all entries, checking for duplicate symbols as it goes."
+        self._symbols, self._colours, self._names = {}, {}, {}
+        for i in range(len(self)):
+            self._index(i, list.__getitem__(self, i))
+
+    def _index(self, i: int, entry: PaletteEntry):
+        self._check(i, entry)
+        self._symbols[entry.symbol] = i
+        self._colours.setdefault(entry.rgb, i)
+        self._names.setdefault(entry.name, i)
+
+    def _check(self, i: int, entry: PaletteEntry):
+        "Raise if another entry than the one at `i` has this symbol."
+        if self._symbols.get(entry.symbol, i) != i:
+            raise ValueError('Palette already contains symbol', entry.symbol)
+
+    def _reassign(self, i: int, old: PaletteEntry, new: PaletteEntry):
+        "Index the entry at `i` as `new` rather than `old`."
+        del self._symbols[old.symbol]
+        self._symbols[new.symbol] = i
+        for index, field in ((self._colours, 1), (self._names, 2)):
+            was, now = old[field], new[field]
+            if was == now:
+                continue
+            if index[was] == i:
+                # Another entry may share it; if so, the first now has it
+                del index[was]
+                for j, entry in enumerate(list.__iter__(self)):
+                    if entry[field] == was:
+                        index[was] = j
+                        break
+            if index.get(now, i) >= i:
+                index[now] = i
+
+    def _position(self, i: int) -> int:
+        "An index as a list takes it, made non-negative."
+        n = len(self)
+        if not -n <= i < n:
+            raise IndexError('Palette index out of range', i)
+        return i % n
+
     @staticmethod
     def interpret_entry(string: str):
         "Interpret e.g. `r ff0000 Red`"
@@ -20,23 +99,168 @@ class Palette(list[PaletteEntry]):
 
     @classmethod
     def from_file(cls, path: Path):
-        self = cls()
+        entries = []
         with open(path) as f:
             for line in f.readlines():
                 line = line.strip().split('#', maxsplit=1)[0]
                 if line:
-                    self.append(self.interpret_entry(line))
-        return self
-    
+                    entries.append(cls.interpret_entry(line))
+        return cls(entries)
+
     def __getitem__(self, symbol: str):
-        for col in self:
-            if col.symbol == symbol:
-                return col
-        raise KeyError('Palette does not contain symbol', symbol)
-    
+        return list.__getitem__(self, self.index_of(symbol))
+
+    def index_of(self, symbol: str) -> int:
+        "The position of the entry with a symbol."
+        try:
+            return self._symbols[symbol]
+        except KeyError:
+            raise KeyError('Palette does not contain symbol', symbol) from None
+
+    def entry(self, i: int) -> PaletteEntry:
+        "The entry at a position."
+        return list.__getitem__(self, i)
+
+    def by_colour(self, rgb) -> PaletteEntry:
+        "The entry with exactly this colour."
+        try:
+            return self.entry(self._colours[tuple(map(int, rgb))])
+        except KeyError:
+            raise KeyError('Palette does not contain colour', rgb) from None
+
+    def by_name(self, name: str) -> PaletteEntry:
+        "The first entry with a name."
+        try:
+            return self.entry(self._names[name])
+        except KeyError:
+            raise KeyError('Palette does not contain name', name) from None
+
+    def listen(self, callback):
+        "Call `callback(change)` after each edit, while a method's object lives."
+        if hasattr(callback, '__self__'):
+            ref = weakref.WeakMethod(callback)
+        else:
+            ref = lambda: callback
+        self._listeners = [r for r in self._listeners if r() is not None]
+        self._listeners.append(ref)
+
+    def unlisten(self, callback):
+        "Stop calling `callback`."
+        self._listeners = [
+            ref for ref in self._listeners if ref() not in (None, callback)]
+
+    def _changed(self, change: Change):
+        self.version += 1
+        self._image = None
+        if self._array is not None:
+            i, old, new = change
+            array = self._array
+            if old is None:
+                array = np.insert(array, i, new.rgb, axis=0)
+            elif new is None:
+                array = np.delete(array, i, axis=0)
+            else:
+                array = array.copy()
+                array[i] = new.rgb
+            array.flags.writeable = False
+            self._array = array
+        self._listeners = [ref for ref in self._listeners if ref() is not None]
+        for ref in list(self._listeners):
+            callback = ref()
+            if callback is not None:
+                callback(change)
+
+    def add(self, entry: PaletteEntry) -> int:
+        "Add an entry at the end, returning its index."
+        i = len(self)
+        self._index(i, entry)
+        list.append(self, entry)
+        self._changed(Change(i, None, entry))
+        return i
+
+    def discard(self, symbol: str) -> PaletteEntry:
+        "Remove the entry with a symbol. Later entries move down one index."
+        return self.pop(self.index_of(symbol))
+
+    def recolour(self, symbol: str, rgb) -> PaletteEntry:
+        "Change an entry's colour, keeping its index."
+        i = self.index_of(symbol)
+        old = self.entry(i)
+        new = PaletteEntry(old.symbol, rgb, old.name)
+        self[i] = new
+        return new
+
+    # List methods, kept to one entry at a time so each edit is a Change
+
+    def append(self, entry: PaletteEntry):
+        self.add(entry)
+
+    def extend(self, entries):
+        for entry in entries:
+            self.add(entry)
+
+    def __iadd__(self, entries):
+        self.extend(entries)
+        return self
+
+    def insert(self, i: int, entry: PaletteEntry):
+        i = min(max(0, i + len(self) if i < 0 else i), len(self))
+        if entry.symbol in self._symbols:
+            raise ValueError('Palette already contains symbol', entry.symbol)
+        list.insert(self, i, entry)
+        self._reindex()
+        self._changed(Change(i, None, entry))
+
+    def __setitem__(self, i: int, entry: PaletteEntry):
+        if isinstance(i, slice):
+            raise TypeError('Palettes are edited one entry at a time')
+        i = self._position(i)
+        self._check(i, entry)
+        old = self.entry(i)
+        list.__setitem__(self, i, entry)
+        self._reassign(i, old, entry)
+        self._changed(Change(i, old, entry))
+
+    def pop(self, i: int = -1) -> PaletteEntry:
+        i = self._position(i)
+        old = list.pop(self, i)
+        self._reindex()
+        self._changed(Change(i, old, None))
+        return old
+
+    def __delitem__(self, i: int):
+        if isinstance(i, slice):
+            raise TypeError('Palettes are edited one entry at a time')
+        self.pop(i)
+
+    def remove(self, entry: PaletteEntry):
+        self.pop(list.index(self, entry))
+
+    def clear(self):
+        while self:
+            self.pop()
+
+    def _reorder(self, *args, **kwargs):
+        raise TypeError('Palette entries keep their order; make a new Palette')
+
+    sort = reverse = __imul__ = _reorder
+
+    def array(self) -> np.ndarray:
+        "The colours as a read-only (n, 3) uint8 array."
+        if self._array is None or len(self._array) != len(self):
+            array = np.array([c.rgb for c in self], dtype=np.uint8).reshape(-1, 3)
+            array.flags.writeable = False
+            self._array = array
+        return self._array
+
     def image(self):
-        im = Image.new('P', (1, len(self)))
-        im.putpalette(sum([c.rgb for c in self], start=[]))
-        for i, col in enumerate(self):
-            im.putpixel((0, i), tuple(col.rgb))
-        return im
\ No newline at end of file
+        "A 1×N 'P' image holding each colour once, in order."
+        if len(self) > 256:
+            raise ValueError(
+                'P images hold at most 256 colours; use a Pattern', len(self))
+        if self._image is None or self._image.height != len(self):
+            im = Image.new('P', (1, len(self)))
+            im.putpalette(self.array().tobytes())
+            im.putdata(range(len(self)))
+            self._image = im
+        return self._image
@@ -0,0 +1,62 @@
+"Quantized patterns: palette indices, for palettes of any size."
+
+import numpy as np
+from PIL import Image
+
+from .palette import Palette
+
+
+class Pattern:
+    """
+    An (h, w) uint16 grid of indices into a palette.
+
+    Unlike a 'P' image this is not limited to 256 colours.
+    It supports the same `size`, `crop`, `resize` and `save`
+    as an image, so the transformations accept either.
+    """
+
+    def __init__(self, indices: np.ndarray, palette: Palette):
+        self.indices = np.asarray(indices, dtype=np.uint16)
+        self.palette = palette
+
+    @classmethod
+    def from_image(cls, im: Image, palette: Palette):
+        "Wrap a 'P' image quantized to `palette.image()`."
+        if im.mode != 'P':
+            raise ValueError('Pattern images must be P mode', im.mode)
+        return cls(np.asarray(im), palette)
+
+    @property
+    def size(self):
+        h, w = self.indices.shape
+        return w, h
+
+    def rgb(self) -> np.ndarray:
+        "The colour of each cell, as an (h, w, 3) uint8 array."
+        return self.palette.array()[self.indices]
+
+    def image(self):
+        "A 'P' image if the palette allows, otherwise 'RGB'."
+        if len(self.palette) > 256:
+            return Image.fromarray(self.rgb())
+        im = Image.fromarray(self.indices.astype(np.uint8), 'P')
+        im.putpalette(self.palette.array().tobytes())
+        return im
+
+    def save(self, fp, *args, **kwargs):
+        self.image().save(fp, *args, **kwargs)
+
+    def crop(self, box):
+        "Crop to a box, rounding coordinates as Image.crop does."
+        x0, y0, x1, y1 = map(int, map(round, box))
+        return Pattern(self.indices[y0:y1, x0:x1], self.palette)
+
+    def resize(
+            self, size: tuple[int, int], resample=None, box=None,
+            reducing_gap=None):
+        "Nearest-neighbour resize, sampling as Image.resize does."
+        x0, y0, x1, y1 = box or (0, 0, *self.size)
+        W, H = size
+        xs = (x0 + (np.arange(W) + 0.5) * (x1 - x0) / W).astype(np.intp)
+        ys = (y0 + (np.arange(H) + 0.5) * (y1 - y0) / H).astype(np.intp)
+        return Pattern(self.indices[ys[:, None], xs], self.palette)
@@ -0,0 +1,285 @@
+"""
+Transform plans: the tools, optimized per image before any pixels load.
+
+Gutter removal, aspect cropping and resizing fuse into one
+`Image.resize(box=...)`, and quantizing moves after the resize
+whenever that gives the same result. Big images are decoded at
+reduced resolution when the resize would discard the detail anyway.
+
+Plans can cache their results, so a later run that changes one step
+only re-runs that step and those after it.
+"""
+
+import hashlib
+from collections import namedtuple
+from math import ceil
+
+import numpy as np
+from PIL import Image
+
+from .cache import Cache
+from .palette import Palette
+from .pattern import Pattern
+from .quantize import Posterizer
+from .transformations import aspect_box, gutter_box
+
+# `key` holds any parameters the description leaves out, for caching;
+# `decode` steps only change how the image is decoded
+Step = namedtuple(
+    'Step', ('description', 'apply', 'key', 'decode'), defaults=(None, False))
+
+# Decode at least this many times the target size, as Image.thumbnail does,
+# so the final resample still has detail to work with
+REDUCING_GAP = 2.0
+
+
+def _round(box):
+    "Round a box as Image.crop does."
+    return tuple(map(int, map(round, box)))
+
+
+def _compose(outer, inner):
+    "A box within `outer`, in the coordinates of outer's parent."
+    x0, y0 = outer[:2]
+    return (x0 + inner[0], y0 + inner[1], x0 + inner[2], y0 + inner[3])
+
+
+def _scale(box, size, original):
+    "Map a box on an image of `original` size onto the same image at `size`."
+    sx, sy = size[0] / original[0], size[1] / original[1]
+    return (box[0] * sx, box[1] * sy, box[2] * sx, box[3] * sy)
+
+
+def _draft(im: Image, factor: float):
+    "JPEG: have libjpeg scale by 1/2, 1/4 or 1/8 while decoding."
+    scale = max(s for s in (1, 2, 4, 8) if s <= factor)
+    if scale == 1:
+        return None
+    w, h = im.size
+    size = ceil(w / scale), ceil(h / scale)
+    def draft(im):
+        im.draft(None, size)
+        return im
+    return Step(f'decode at 1/{scale} scale (JPEG draft)', draft, decode=True)
+
+
+def _pyramid(im: Image, factor: float):
+    "TIFF: pick the smallest page that is a big enough copy of the first."
+    w, h = im.size
+    best = None
+    try:
+        for i in range(1, getattr(im, 'n_frames', 1)):
+            im.seek(i)
+            fw, fh = im.size
+            if abs(fw / fh - w / h) > 0.01 or fw * factor < w:
+                continue
+            if best is None or fw < best[1][0]:
+                best = i, im.size
+    finally:
+        im.seek(0)
+    if best is None:
+        return None
+    i, size = best
+    def seek(im):
+        im.seek(i)
+        return im
+    return Step(
+        f'decode pyramid level {i} at {size[0]}×{size[1]}', seek, decode=True)
+
+
+def reduced_decode(im: Image, box, target: tuple[int, int]):
+    "A step to decode `im` at reduced resolution for resizing `box` to `target`."
+    w, h = box[2] - box[0], box[3] - box[1]
+    factor = min(w / target[0], h / target[1]) / REDUCING_GAP
+    if factor < 2:
+        return None
+    if im.format == 'JPEG':
+        return _draft(im, factor)
+    if im.format == 'TIFF':
+        return _pyramid(im, factor)
+
+
+def crop_box(
+        size: tuple[int, int], gutter: int = None,
+        target: tuple[int, int] = None):
+    "The part of an image kept by remove_gutter then resize, as one box."
+    box = (0, 0, *size)
+    if gutter:
+        box = _round(gutter_box(size, gutter))
+    if target:
+        w, h = box[2] - box[0], box[3] - box[1]
+        inner = aspect_box((w, h), target)
+        if inner:
+            box = _compose(box, _round(inner))
+    return box
+
+
+def resize_nearest(im: Image, box, original: tuple[int, int], target):
+    """
+    Resize a box of an image, given on its `original` size, to `target`
+    by sampling the nearest pixel. Crops first: given a box, Pillow's
+    NEAREST picks other pixels than Pattern.resize and stream do.
+    """
+    if box != (0, 0, *original) or im.size != original:
+        im = im.crop(_round(_scale(box, im.size, original)))
+    return im.resize(target, Image.NEAREST)
+
+
+def file_digest(path) -> str:
+    "A digest of a file's bytes, to key results made from it."
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _store(result, path):
+    "Write a result: a pattern's indices, or an image's raw pixels."
+    with open(path, 'wb') as f:
+        if isinstance(result, Pattern):
+            np.savez(f, indices=result.indices)
+            return
+        fields = dict(
+            mode=result.mode, size=result.size,
+            pixels=np.frombuffer(result.tobytes(), dtype=np.uint8))
+        if result.mode == 'P':
+            fields['palette'] = np.array(result.getpalette(), dtype=np.uint8)
+        np.savez(f, **fields)
+
+
+def _restore(path, palette: Palette = None):
+    "Read a result written by `_store`."
+    with np.load(path) as f:
+        if 'indices' in f:
+            return Pattern(f['indices'], palette)
+        im = Image.frombytes(
+            str(f['mode']), tuple(map(int, f['size'])), f['pixels'].tobytes())
+        if 'palette' in f:
+            im.putpalette(f['palette'].tobytes())
+        return im
+
+
+class Plan(list[Step]):
+    "Steps applied in order to an image."
+
+    def __call__(self, im: Image):
+        for step in self:
+            im = step.apply(im)
+        return im
+
+    def stages(self) -> list[Step]:
+        "Decoding (with any decode steps) as one step, then the rest."
+        n = sum(step.decode for step in self)
+        def decode(im):
+            for step in self[:n]:
+                im = step.apply(im)
+            im.load()
+            return im
+        key = '; '.join(step.key or step.description for step in self[:n])
+        return [Step('decode', decode, f'decode {key}')] + self[n:]
+
+    def cached(
+            self, im: Image, source: str, cache: Cache,
+            palette: Palette = None):
+        """
+        Apply the steps, starting from the longest prefix of them
+        whose result is cached, and caching each result after it.
+
+        Results are keyed by `source`, such as the `file_digest` of the
+        input, and the parameters of each step so far. Patterns are
+        cached as their indices, restored with `palette`.
+        Sets `reused` to the number of stages whose work was skipped.
+        """
+        stages = self.stages()
+        keys = []
+        digest = source
+        for stage in stages:
+            digest = hashlib.sha256(
+                f'{digest}\n{stage.key or stage.description}'.encode()
+            ).hexdigest()
+            keys.append(f'result-{digest[:32]}.npz')
+
+        self.reused = 0
+        for i in reversed(range(len(stages))):
+            path = cache.get(keys[i])
+            if path is not None:
+                im = _restore(path, palette)
+                self.reused = i + 1
+                break
+        for stage, key in zip(stages[self.reused:], keys[self.reused:]):
+            im = stage.apply(im)
+            cache.put(key, lambda path: _store(im, path))
+        return im
+
+    def explain(self):
+        return '\n'.join(
+            f'{i}. {step.description}' for i, step in enumerate(self, 1))
+
+
+def plan(
+        im: Image, posterizer: Posterizer = None,
+        gutter: int = None, target: tuple[int, int] = None, reduce=True):
+    """
+    Plan posterize, then remove_gutter, then resize, for an opened image.
+
+    With a posterizer, resizing samples the nearest pixel of the
+    cropped image, and the result matches applying them in that order.
+    If the posterizer is pointwise, it is equivalent to quantize the
+    (smaller) resized image, sampled the same way. A Ditherer always
+    goes after resizing, as it is meant to dither the final grid.
+
+    Without one, the crop is fused into a filtered `resize(box=...)`,
+    whose filter also reads pixels just outside the box. So pixels
+    along the edges can differ a little from cropping first.
+
+    With `reduce`, big images are decoded at reduced resolution
+    and resampled with a reducing gap, which closely matches but is
+    not identical to resampling from full resolution.
+    """
+    steps = Plan()
+    size = im.size
+    box = crop_box(size, gutter, target)
+
+    whole = box == (0, 0, *size)
+    late = posterizer is not None and posterizer.after_resize
+    decode = reduce and target and reduced_decode(im, box, target)
+    if decode:
+        steps.append(decode)
+    if posterizer is not None:
+        detail = posterizer.metric
+        if posterizer.dithering:
+            detail += f', {posterizer.dithering} dithered'
+        colours = hashlib.sha256(posterizer.palette.array().tobytes())
+        posterize = Step(
+            f'posterize to {len(posterizer.palette)} colours ({detail})',
+            posterizer,
+            f'posterize {type(posterizer).__name__} {posterizer.key} '
+            f'{colours.hexdigest()}')
+    if posterizer is not None and not late:
+        steps.append(posterize)
+
+    if target:
+        resample = Image.NEAREST if posterizer is not None else None
+        gap = REDUCING_GAP if reduce and resample is None else None
+        if resample == Image.NEAREST:
+            def apply(im):
+                return resize_nearest(im, box, size, target)
+        else:
+            def apply(im):
+                return im.resize(
+                    target, resample, reducing_gap=gap,
+                    box=None if whole and not decode
+                        else _scale(box, im.size, size))
+        steps.append(Step(
+            f'resize {"" if whole else f"box {box} "}to {target[0]}×{target[1]}'
+            f'{" (nearest)" if resample == Image.NEAREST else ""}',
+            apply,
+            f'resize {box} of {size} to {target} ({resample}, gap {gap}, '
+            f'{"cropped first" if resample == Image.NEAREST else "fused"})'))
+    elif not whole:
+        steps.append(Step(f'crop to {box}', lambda im: im.crop(box)))
+
+    if late:
+        steps.append(posterize)
+    return steps
@@ -0,0 +1,279 @@
+"Palette quantization."
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from .colour import delta_e2000, srgb_to_lab
+from .palette import Change, Palette
+from .pattern import Pattern
+
+METRICS = ('rgb', 'lab', 'ciede2000')
+
+# Largest distance matrix (colours × palette) computed at once
+CHUNK = 1 << 20
+# CIEDE2000 is only evaluated against this many CIELAB-nearest candidates
+CANDIDATES = 8
+# Images with more distinct colours than this use a cached 8-bit LUT
+# for CIEDE2000: it costs a few times as much to build as to search such
+# an image directly, but after that any image is one gather
+CIEDE2000_LUT_COLOURS = 1 << 21
+# Strips per thread when quantizing in parallel, to balance uneven strips
+STRIPS_PER_THREAD = 4
+
+
+def rgb_array(im: Image) -> np.ndarray:
+    "An image as an (h, w, 3) uint8 array. Arrays pass through."
+    if isinstance(im, np.ndarray):
+        return im
+    if im.mode != 'RGB':
+        im = im.convert('RGB')
+    return np.asarray(im)
+
+
+def unique_colours(rgb: np.ndarray):
+    "Distinct colours of an (n, 3) uint8 array, and the inverse mapping."
+    keys = (rgb[:, 0].astype(np.uint32) << 16
+        | rgb[:, 1].astype(np.uint32) << 8 | rgb[:, 2])
+    if len(keys) < 1 << 20:
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        return uniq, lambda values: values[inverse]
+    # Big images: a dense 24-bit table beats sorting
+    seen = np.zeros(1 << 24, dtype=bool)
+    seen[keys] = True
+    uniq = np.flatnonzero(seen).astype(np.uint32)
+    def inverse(values):
+        table = np.empty(1 << 24, dtype=values.dtype)
+        table[uniq] = values
+        return table[keys]
+    return uniq, inverse
+
+
+def unpack(keys: np.ndarray) -> np.ndarray:
+    "Colours packed as 0xRRGGBB, as an (n, 3) uint8 array."
+    return np.stack(
+        (keys >> 16, keys >> 8 & 0xff, keys & 0xff), axis=-1).astype(np.uint8)
+
+
+def _patch(array: np.ndarray, change: Change, rows: np.ndarray) -> np.ndarray:
+    "An array of per-entry rows, edited as the palette was."
+    i, old, new = change
+    if old is None:
+        return np.insert(array, i, rows, axis=0)
+    if new is None:
+        return np.delete(array, i, axis=0)
+    array = array.copy()
+    array[i] = rows[0]
+    return array
+
+
+class Posterizer:
+    """
+    A palette compiled once into quantization state.
+
+    Calling it on an image only does the per-pixel work,
+    so one Posterizer can be reused across many images.
+
+    The 'rgb' metric uses Pillow's quantizer (with its dithering);
+    'lab' and 'ciede2000' use a vectorized nearest-colour search
+    in CIELAB, without dithering. Palettes over 256 colours don't fit
+    Pillow, so always use the vectorized search.
+
+    Setting `lut` to a LUT replaces the search with table lookups,
+    and `threads` quantizes strips of each image in parallel.
+
+    CIEDE2000 is slow to search: tens of times slower than Pillow
+    on a photo's millions of colours. So for an image with more than
+    CIEDE2000_LUT_COLOURS of them, if a `cache` is set, an exact 8-bit
+    LUT is loaded from it (built there the first time, for this palette)
+    and used from then on. The results are the same.
+
+    Edits to the palette patch the compiled state, and any LUT,
+    only where they make a difference. A CIEDE2000 LUT is dropped
+    instead, being far slower to patch than to load from the cache
+    for the edited palette when next wanted.
+    """
+
+    def __init__(
+            self, palette: Palette, metric='rgb',
+            dither=Image.Dither.FLOYDSTEINBERG, threads=1):
+        if metric not in METRICS:
+            raise ValueError('Unknown metric', metric)
+        self.palette = palette
+        self.metric = metric
+        self.dither = dither
+        self.threads = threads
+
+        self._rgb = palette.array()
+        self._lab = srgb_to_lab(self._rgb)
+        self._points = self._rgb.astype(np.float32)
+        if metric != 'rgb':
+            self._points = self._lab
+        self._norms = (self._points ** 2).sum(axis=1)
+
+        self.lut = None
+        self.cache = None
+        self._image = None
+        if len(palette) <= 256:
+            self._image = palette.image()
+            self._image.load()
+        palette.listen(self._changed)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.palette.listen(self._changed)
+
+    def _changed(self, change: Change):
+        "Patch the compiled palette for one edit, then the LUT."
+        new = change.new
+        rgb = np.array([new.rgb if new else (0, 0, 0)], dtype=np.uint8)
+        lab = srgb_to_lab(rgb)
+        point = lab if self.metric != 'rgb' else rgb.astype(np.float32)
+        self._rgb = self.palette.array()
+        self._lab = _patch(self._lab, change, lab)
+        self._points = _patch(self._points, change, point)
+        self._norms = _patch(self._norms, change, (point ** 2).sum(axis=1))
+
+        self._image = None
+        if len(self.palette) <= 256:
+            self._image = self.palette.image()
+            self._image.load()
+        if self.metric == 'ciede2000':
+            self.lut = None
+        elif self.lut is not None:
+            self.lut.patch(change)
+
+    def _nearest_points(self, points: np.ndarray, k=1) -> np.ndarray:
+        "Indices of the k nearest palette points, nearest first."
+        # |x - p|² without the |x|² term, which is constant per row
+        dist = self._norms - 2 * points @ self._points.T
+        if k == 1:
+            return dist.argmin(axis=1)[:, None]
+        near = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(dist, near, 1).argsort(axis=1)
+        return np.take_along_axis(near, order, 1)
+
+    def _nearest_chunk(self, rgb: np.ndarray) -> np.ndarray:
+        if self.metric == 'rgb':
+            return self._nearest_points(rgb.astype(np.float32))[:, 0]
+
+        lab = srgb_to_lab(rgb)
+        if self.metric == 'lab':
+            return self._nearest_points(lab)[:, 0]
+
+        k = min(CANDIDATES, len(self._lab))
+        candidates = self._nearest_points(lab, k)
+        dist = delta_e2000(lab[:, None, :], self._lab[candidates])
+        return np.take_along_axis(
+            candidates, dist.argmin(axis=1)[:, None], 1)[:, 0]
+
+    def distance(self, rgb: np.ndarray, index) -> np.ndarray:
+        """
+        Distance by the metric (squared, except CIEDE2000) from each colour
+        of an (n, 3) uint8 array to palette entries `index`, broadcast.
+        """
+        if self.metric == 'rgb':
+            return ((rgb.astype(np.float32) - self._points[index]) ** 2).sum(-1)
+        lab = srgb_to_lab(rgb)
+        if self.metric == 'lab':
+            return ((lab - self._lab[index]) ** 2).sum(-1)
+        return delta_e2000(lab, self._lab[index])
+
+    def nearest(self, rgb: np.ndarray) -> np.ndarray:
+        "Index of the nearest palette entry for each colour of an (n, 3) array."
+        rgb = np.asarray(rgb, dtype=np.uint8)
+        out = np.empty(len(rgb), dtype=np.intp)
+        step = max(1, CHUNK // len(self._points))
+        for i in range(0, len(rgb), step):
+            out[i:i+step] = self._nearest_chunk(rgb[i:i+step])
+        return out
+
+    @property
+    def _pillow(self):
+        "Whether Pillow's quantizer does the work."
+        return self.metric == 'rgb' and self.lut is None \
+            and self._image is not None
+
+    @property
+    def pointwise(self):
+        "Whether each pixel maps independently, so commutes with sampling."
+        return not (self._pillow and self.dither)
+
+    @property
+    def after_resize(self):
+        "Whether pipelines may quantize after resizing, rather than before."
+        return self.pointwise
+
+    @property
+    def dithering(self):
+        "The name of the dithering applied, if any."
+        return None if self.pointwise else 'floyd-steinberg'
+
+    @property
+    def key(self) -> str:
+        "How colours are matched, as cache keys need: methods can differ."
+        if self._pillow:
+            return f'{self.metric} pillow dither {int(self.dither)}'
+        if self.lut is not None:
+            return f'{self.metric} lut {self.lut.bits}'
+        return f'{self.metric} search'
+
+    def _indices(self, rgb: np.ndarray) -> np.ndarray:
+        "Palette indices for an (h, w, 3) array, on one thread."
+        h, w, _ = rgb.shape
+        if self._pillow:
+            im = Image.fromarray(rgb).quantize(
+                palette=self._image, dither=self.dither)
+            return np.asarray(im)
+        if self.lut is not None:
+            return self.lut.lookup(rgb.reshape(-1, 3)).reshape(h, w)
+        uniq, inverse = unique_colours(rgb.reshape(-1, 3))
+        near = self.nearest(unpack(uniq)).astype(np.uint16)
+        return inverse(near).reshape(h, w)
+
+    def indices(self, im: Image) -> np.ndarray:
+        """
+        Palette index of every pixel, as an (h, w) uint16 array.
+
+        With `threads`, pointwise quantizing is split into strips
+        written straight into the result. NumPy and Pillow release the GIL
+        for the heavy lifting, and the output is identical to one thread.
+        """
+        rgb = rgb_array(im)
+        h, w, _ = rgb.shape
+        if (self.metric == 'ciede2000' and self.lut is None
+                and self.cache is not None and h * w > CIEDE2000_LUT_COLOURS
+                and len(unique_colours(rgb.reshape(-1, 3))[0])
+                    > CIEDE2000_LUT_COLOURS):
+            from .lut import LUT  # lut imports this module
+            self.lut = LUT.load(self, 8, self.cache)
+        strips = self.threads * STRIPS_PER_THREAD
+        if self.threads == 1 or not self.pointwise or h < strips:
+            return self._indices(rgb).astype(np.uint16, copy=False)
+
+        out = np.empty((h, w), dtype=np.uint16)
+        def work(rows):
+            out[rows] = self._indices(rgb[rows])
+        bounds = np.linspace(0, h, strips + 1).astype(int)
+        with ThreadPoolExecutor(self.threads) as pool:
+            list(pool.map(work, map(slice, bounds[:-1], bounds[1:])))
+        return out
+
+    def pattern(self, im: Image) -> Pattern:
+        "Quantize to a Pattern, which allows any palette size."
+        return Pattern(self.indices(im), self.palette)
+
+    def __call__(self, im: Image):
+        "Quantize to a 'P' image, or to a Pattern if over 256 colours."
+        if self._image is None:
+            return self.pattern(im)
+
+        if self._pillow and self.threads == 1:
+            if im.mode not in ('RGB', 'L'):
+                im = im.convert('RGB')
+            return im.quantize(palette=self._image, dither=self.dither)
+
+        out = Image.fromarray(self.indices(im).astype(np.uint8), 'P')
+        out.putpalette(self._rgb.tobytes())
+        return out
@@ -0,0 +1,161 @@
+"""
+Streaming: images processed in strips within a memory budget.
+
+For scans too big to copy several times over. Sources are memory-mapped
+a strip at a time where their format allows, and output is appended
+strip by strip, either as palette indices in a .npy array
+(which np.load can memory-map) or as colours in a raw .ppm image.
+"""
+
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from .pipeline import crop_box
+from .quantize import Posterizer
+
+DEFAULT_BUDGET = 256 << 20
+# Working memory per output pixel while posterizing, generously
+BYTES_PER_PIXEL = 64
+
+
+class Mapped:
+    """
+    A raw uint8 image in a file, mapped only a strip at a time.
+
+    Index it with an ascending array of rows. Each access maps just
+    those rows and unmaps them after, so pages read never pile up.
+    """
+
+    def __init__(self, path: Path, offset: int, shape: tuple[int, ...]):
+        self.path = path
+        self.offset = offset
+        self.shape = shape
+        self.ndim = len(shape)
+
+    def __getitem__(self, rows: np.ndarray) -> np.ndarray:
+        lo, hi = rows[0], rows[-1] + 1
+        row_bytes = int(np.prod(self.shape[1:]))
+        strip = np.memmap(
+            self.path, np.uint8, 'r', self.offset + lo * row_bytes,
+            (hi - lo, *self.shape[1:]))
+        return np.array(strip[rows - lo])
+
+
+def _whole(path: Path, nbytes: int, budget: int):
+    "Raise unless decoding `nbytes` at once fits in `budget`."
+    if budget is not None and nbytes > budget:
+        raise ValueError(
+            f"Can't stream this format, and decoding it whole takes "
+            f"{nbytes >> 20} MB; convert it to .ppm or uint8 .npy", path)
+
+
+def open_array(path: Path, budget: int = None):
+    """
+    An image file as an (h, w, 3) or (h, w) uint8 array.
+
+    Uint8 .npy arrays and uncompressed 8-bit RGB or L images (such as .ppm)
+    are Mapped; anything else, compressed TIFF scans included, has to be
+    decoded whole, which raises ValueError if it needs over `budget` bytes.
+    """
+    path = Path(path)
+    if path.suffix == '.npy':
+        with open(path, 'rb') as f:
+            major, _ = np.lib.format.read_magic(f)
+            read_header = (
+                np.lib.format.read_array_header_1_0 if major == 1
+                else np.lib.format.read_array_header_2_0)
+            shape, fortran, dtype = read_header(f)
+            if dtype == np.uint8 and not fortran:
+                return Mapped(path, f.tell(), shape)
+        _whole(path, int(np.prod(shape)) * dtype.itemsize, budget)
+        return np.load(path)
+
+    with Image.open(path) as im:
+        if len(im.tile) == 1:
+            decoder, extent, offset, args = im.tile[0]
+            rawmode = args[0] if isinstance(args, tuple) else args
+            if (decoder == 'raw' and rawmode in ('RGB', 'L')
+                    and extent == (0, 0, *im.size)):
+                w, h = im.size
+                shape = (h, w, 3) if rawmode == 'RGB' else (h, w)
+                return Mapped(path, offset, shape)
+        _whole(path, im.width * im.height * 3, budget)
+        return np.asarray(im.convert('RGB'))
+
+
+class _Writer:
+    "Rows appended to a raw file after a header."
+
+    def __init__(self, path: Path, header: bytes):
+        self.file = open(path, 'wb')
+        self.file.write(header)
+
+    def write(self, rows: np.ndarray):
+        self.file.write(np.ascontiguousarray(rows).tobytes())
+
+    def close(self):
+        self.file.close()
+
+
+def _writer(path: Path, size: tuple[int, int], posterizer: Posterizer):
+    "A .npy of indices (or colours), or a .ppm of colours."
+    w, h = size
+    path = Path(path)
+    if path.suffix == '.ppm':
+        return _Writer(path, b'P6\n%d %d\n255\n' % size)
+    if path.suffix != '.npy':
+        raise ValueError('Streamed output must be .npy or .ppm', path)
+
+    if posterizer is None:
+        shape, dtype = (h, w, 3), np.uint8
+    else:
+        shape, dtype = (h, w), np.uint16
+    header = BytesIO()
+    np.lib.format.write_array_header_1_0(header, {
+        'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        'fortran_order': False, 'shape': shape})
+    return _Writer(path, header.getvalue())
+
+
+def stream(
+        src: Mapped | np.ndarray, out: Path, posterizer: Posterizer = None,
+        gutter: int = None, target: tuple[int, int] = None,
+        budget=DEFAULT_BUDGET):
+    """
+    Posterize, remove_gutter and resize `src` into the file `out`.
+
+    Resizing samples the nearest pixel, so each output strip reads only
+    the source rows it needs. Peak memory stays near `budget` bytes
+    however large the source is. Quantizing must be pointwise,
+    as dithering would show seams between strips.
+    """
+    if posterizer is not None and not posterizer.pointwise:
+        raise ValueError('Streaming needs a posterizer without dithering')
+    h, w = src.shape[:2]
+    x0, y0, x1, y1 = crop_box((w, h), gutter, target)
+    W, H = target or (x1 - x0, y1 - y0)
+
+    # Nearest sampling, as Image.resize does
+    xs = (x0 + (np.arange(W) + 0.5) * (x1 - x0) / W).astype(np.intp)
+    ys = (y0 + (np.arange(H) + 0.5) * (y1 - y0) / H).astype(np.intp)
+    contiguous = np.array_equal(xs, np.arange(x0, x1))
+
+    rows = max(1, budget // (w * 3 + W * BYTES_PER_PIXEL))
+    dest = _writer(out, (W, H), posterizer)
+    colours = posterizer and posterizer.palette.array()
+    try:
+        for i in range(0, H, rows):
+            strip = src[ys[i:i+rows]]
+            strip = strip[:, x0:x1] if contiguous else strip[:, xs]
+            if strip.ndim == 2:
+                strip = np.repeat(strip[..., None], 3, axis=2)
+            if posterizer is not None:
+                strip = posterizer.pattern(Image.fromarray(strip)).indices
+                if Path(out).suffix == '.ppm':
+                    strip = colours[strip]
+            dest.write(strip)
+    finally:
+        dest.close()
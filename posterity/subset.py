@@ -0,0 +1,116 @@
+"""
+Choosing a few colours of a large catalogue to suit an image.
+
+A fixed-size sample of the image is clustered by mini-batch k-means
+in CIELAB, and each cluster snapped to its nearest catalogue colour.
+The cost depends on the sample size, not the image's resolution.
+"""
+
+from math import ceil, sqrt
+
+import numpy as np
+from PIL import Image
+
+from .colour import srgb_to_lab
+from .palette import Palette
+from .quantize import rgb_array
+
+SAMPLE = 1 << 16
+BATCH = 1 << 10
+ITERATIONS = 200
+
+
+def sample(src, n=SAMPLE) -> np.ndarray:
+    """
+    About n pixels spread evenly over an image, as an (m, 3) uint8 array.
+
+    Images are resized by nearest sampling, which reads only those
+    pixels. Arrays (including streamed ones) are read by whole rows.
+    """
+    if isinstance(src, Image.Image):
+        w, h = src.size
+        scale = sqrt(n / (w * h))
+        if scale < 1:
+            src = src.resize(
+                (max(1, round(w * scale)), max(1, round(h * scale))), Image.NEAREST)
+        return rgb_array(src).reshape(-1, 3)
+    h, w = src.shape[:2]
+    rows = np.unique(np.linspace(0, h - 1, min(h, ceil(sqrt(n * h / w)))).astype(np.intp))
+    cols = np.unique(np.linspace(0, w - 1, min(w, ceil(n / len(rows)))).astype(np.intp))
+    pixels = np.asarray(src[rows])[:, cols]
+    if pixels.ndim == 2:
+        pixels = np.repeat(pixels[..., None], 3, axis=2)
+    return pixels.reshape(-1, 3)
+
+
+def _nearest(points: np.ndarray, centres: np.ndarray) -> np.ndarray:
+    "Index of each point's nearest centre, by squared distance."
+    d = (centres ** 2).sum(1) - 2 * points @ centres.T
+    return d.argmin(1)
+
+
+def kmeans(points: np.ndarray, k: int, batch=BATCH, iterations=ITERATIONS, seed=0):
+    """
+    Mini-batch k-means (Sculley, 2010), seeded by k-means++.
+
+    Each iteration moves the centres nearest a random batch towards it,
+    by steps shrinking with how many points each centre has seen.
+    """
+    rng = np.random.default_rng(seed)
+    points = points.astype(np.float32)
+    k = min(k, len(points))
+    # k-means++: each new centre picked with probability by squared distance
+    centres = [points[rng.integers(len(points))]]
+    d = ((points - centres[0]) ** 2).sum(1)
+    for _ in range(1, k):
+        if not d.sum():
+            break
+        centres.append(points[rng.choice(len(points), p=d / d.sum())])
+        d = np.minimum(d, ((points - centres[-1]) ** 2).sum(1))
+    centres = np.array(centres)
+
+    seen = np.zeros(len(centres))
+    for _ in range(iterations):
+        x = points[rng.integers(len(points), size=min(batch, len(points)))]
+        nearest = _nearest(x, centres)
+        seen += np.bincount(nearest, minlength=len(centres))
+        # Running means: the same as per-point steps of 1/count, in order
+        total = np.zeros_like(centres)
+        np.add.at(total, nearest, x)
+        n = np.bincount(nearest, minlength=len(centres))
+        moved = n > 0
+        rate = (n[moved] / seen[moved])[:, None]
+        centres[moved] += rate * (total[moved] / n[moved, None] - centres[moved])
+    return centres
+
+
+def choose(catalogue: Palette, src, n: int, samples=SAMPLE, seed=0) -> Palette:
+    """
+    The n catalogue colours that best suit an image, in catalogue order.
+
+    Clusters that snap to a colour already chosen take their
+    next nearest instead, so exactly n distinct colours are kept.
+    """
+    entries = list(catalogue)
+    if n >= len(entries):
+        return catalogue
+    lab = srgb_to_lab(sample(src, samples))
+    centres = kmeans(lab, n, seed=seed)
+    options = srgb_to_lab(catalogue.array()).astype(np.float32)
+
+    d = ((centres[:, None] - options[None]) ** 2).sum(-1)
+    chosen = set()
+    # Centres with the clearest match pick first
+    for c in np.argsort(d.min(1)):
+        for option in np.argsort(d[c]):
+            if option not in chosen:
+                chosen.add(int(option))
+                break
+    # Too few distinct pixels for n clusters: fill in by how often used
+    if len(chosen) < n:
+        use = np.bincount(_nearest(lab, options), minlength=len(options))
+        for option in np.argsort(-use, kind='stable'):
+            if len(chosen) == n:
+                break
+            chosen.add(int(option))
+    return type(catalogue)(entries[i] for i in sorted(chosen))
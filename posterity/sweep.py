@@ -0,0 +1,187 @@
+"""
+Try an image at several sizes, palettes and ditherings at once.
+
+The variants share their work: the image is decoded once, resized
+once per size and each palette compiled once, and only quantizing
+is done per variant, with the variants in parallel. Each variant is
+written as its own file, and all of them side by side on a contact sheet.
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+import os
+from pathlib import Path
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+from .dither import METHODS as DITHERS, Ditherer
+from .palette import Palette
+from .pattern import Pattern
+from .pipeline import crop_box, reduced_decode, resize_nearest
+from .quantize import METRICS, Posterizer
+
+
+def decode(im: Image, sizes, gutter: int = None, reduce=True):
+    """
+    Decode an opened image once for every size, as RGB: at reduced
+    resolution only if that leaves enough detail for the biggest.
+    """
+    if reduce:
+        def factor(target):
+            x0, y0, x1, y1 = crop_box(im.size, gutter, target)
+            return min((x1 - x0) / target[0], (y1 - y0) / target[1])
+        target = min(sizes, key=factor)
+        step = reduced_decode(im, crop_box(im.size, gutter, target), target)
+        if step:
+            im = step.apply(im)
+    return im.convert('RGB')
+
+
+def resize(im: Image, size, target, gutter: int = None):
+    """
+    Resize a decoded image of an original `size` to `target`,
+    sampling the nearest pixel as a posterizing plan does.
+    """
+    return resize_nearest(im, crop_box(size, gutter, target), size, target)
+
+
+def sweep(
+        im: Image, sizes, palettes: dict[str, Palette], dithers=('none',),
+        metric='rgb', gutter: int = None, reduce=True, threads=None):
+    """
+    Every variant of an opened image, by (size, palette name, dither).
+
+    Work shared between variants is done once; the variants themselves
+    are quantized in parallel.
+    """
+    original = im.size
+    im = decode(im, sizes, gutter, reduce)
+
+    def compile(palette):
+        posterizer = Posterizer(palette, metric, dither=Image.Dither.NONE)
+        return {
+            d: posterizer if d == 'none' else Ditherer(posterizer, d)
+            for d in dithers}
+
+    with ThreadPoolExecutor(threads) as pool:
+        resized = dict(zip(sizes, pool.map(
+            lambda target: resize(im, original, target, gutter), sizes)))
+        compiled = dict(zip(palettes, pool.map(compile, palettes.values())))
+
+        variants = list(product(sizes, palettes, dithers))
+        return dict(zip(variants, pool.map(
+            lambda v: compiled[v[1]][v[2]](resized[v[0]]), variants)))
+
+
+def palette_names(paths) -> dict:
+    "A short name for each palette file: its stem, numbered if shared."
+    stems = [Path(p).stem for p in paths]
+    return {
+        p: stem if stems.count(stem) == 1
+            else f'{stem}{stems[:i].count(stem) + 1}'
+        for i, (p, stem) in enumerate(zip(paths, stems))}
+
+
+def label(variant, names: dict = None) -> str:
+    (w, h), palette, dither = variant
+    if names:
+        palette = names[palette]
+    return f'{w}x{h}-{palette}-{dither}'
+
+
+def contact_sheet(
+        results: dict, columns: int, cell=192, margin=8, names: dict = None):
+    """
+    Results in a grid, each enlarged to fit a `cell` pixel square
+    without blurring, and labelled, with `names` for the palettes.
+    """
+    text = 12
+    rows = -(-len(results) // columns)
+    step = cell + margin, cell + text + 2 * margin
+    sheet = Image.new(
+        'RGB', (columns * step[0] + margin, rows * step[1] + margin), 'white')
+    draw = ImageDraw.Draw(sheet)
+    for i, (variant, result) in enumerate(results.items()):
+        im = result.image() if isinstance(result, Pattern) else result
+        w, h = im.size
+        scale = cell / max(w, h)
+        if scale >= 1:
+            # Whole multiples keep every cell the same size
+            scale = int(scale)
+        size = max(1, round(w * scale)), max(1, round(h * scale))
+        im = im.convert('RGB').resize(size, Image.NEAREST)
+        x = margin + i % columns * step[0]
+        y = margin + i // columns * step[1]
+        sheet.paste(im, (x + (cell - size[0]) // 2, y + (cell - size[1]) // 2))
+        draw.text(
+            (x + cell / 2, y + cell + margin + text / 2), label(variant, names),
+            fill='black', anchor='mm')
+    return sheet
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('image', help="The path to the image.")
+    parser.add_argument(
+        '--size', '-s', type=int, nargs=2, action='append', default=[],
+        metavar=('W', 'H'), help="A size to try. Repeatable.")
+    parser.add_argument(
+        '--square', '-S', type=int, action='append', default=[],
+        metavar='N', help="A square size to try. Repeatable.")
+    parser.add_argument(
+        '--palette', '-p', nargs='+', required=True,
+        help="Palette.txt files to try.")
+    parser.add_argument(
+        '--dither', '-d', nargs='+', choices=('none',) + DITHERS,
+        default=['none'], help="Ditherings to try. (default: none)")
+    parser.add_argument(
+        '--metric', '-m', choices=METRICS, default='rgb',
+        help="Colour distance for all palettes.")
+    parser.add_argument(
+        '--gutter', '-g', type=int, default=None,
+        help="Remove G%% of pixels from all edge.")
+    parser.add_argument(
+        '--full-decode', action='store_true',
+        help="Decode at full resolution, rather than reduced "
+             "when every size is small.")
+    parser.add_argument(
+        '--output', '-o', default=None,
+        help="Directory for the variants and contact sheet. "
+             "(default: {stem}-sweep)")
+    parser.add_argument(
+        '--threads', '-t', type=int, default=os.cpu_count(),
+        help="Variants quantized in parallel.")
+    parser.add_argument(
+        '--cell', type=int, default=192,
+        help="Size of each variant on the contact sheet, in pixels.")
+    args = parser.parse_args()
+
+    sizes = [tuple(s) for s in args.size] + [(n, n) for n in args.square]
+    sizes = list(dict.fromkeys(sizes))
+    if not sizes:
+        parser.error('give at least one --size or --square')
+    path = Path(args.image)
+    out = Path(args.output or f'{path.stem}-sweep')
+    palettes = {p: Palette.from_file(p) for p in dict.fromkeys(args.palette)}
+    names = palette_names(list(palettes))
+    dithers = list(dict.fromkeys(args.dither))
+
+    start = time.perf_counter()
+    with Image.open(path) as im:
+        results = sweep(
+            im, sizes, palettes, dithers,
+            args.metric, args.gutter, not args.full_decode, args.threads)
+
+    out.mkdir(parents=True, exist_ok=True)
+    for variant, result in results.items():
+        result.save(out / f'{path.stem}-{label(variant, names)}.png')
+    columns = len(palettes) * len(dithers)
+    contact_sheet(results, columns, args.cell, names=names).save(
+        out / 'contact.png')
+    print(
+        f'{len(results)} variants ({len(sizes)} sizes × {len(palettes)} '
+        f'palettes × {len(dithers)} ditherings) in '
+        f'{time.perf_counter() - start:.2f}s -> {out}', file=sys.stderr)
@@ -1,39 +1,57 @@
 from PIL import Image
 from .palette import Palette
+from .quantize import Posterizer
 
-def remove_gutter(im: Image, gutter: int):
-    "Remove gutter% of pixels from edges."
-    w, h = im.size
+def gutter_box(size: tuple[int, int], gutter: int):
+    "The box left after removing gutter% of pixels from edges."
+    w, h = size
     g = min(w, h) * gutter/100
-    return im.crop((g, g, w-g, h-g))
+    return (g, g, w-g, h-g)
 
 
-def resize(im: Image, size: tuple[int, int]):
-    "Resize, cropping if aspect ratios differ."
-    w, h = im.size
+def aspect_box(size: tuple[int, int], target: tuple[int, int]):
+    "The central box with the aspect ratio of target, or None if already so."
+    w, h = size
     aspect = w/h
-    W, H = size
+    W, H = target
     desired_aspect = W / H
     
     if desired_aspect == aspect:
         # source is ok aspect
-        return im.resize(size)
+        return None
     
     if aspect > desired_aspect:
         # source is too wide
         w2 = h * desired_aspect
         x0 = (w - w2) // 2
-        im = im.crop((x0, 0, w-x0, h))
+        return (x0, 0, w-x0, h)
     
     if aspect < desired_aspect:
         # source is too tall
         h2 = w / desired_aspect
         y0 = (h - h2) // 2
-        im = im.crop((0, y0, w, h-y0))
+        return (0, y0, w, h-y0)
+
+
+def remove_gutter(im: Image, gutter: int):
+    "Remove gutter% of pixels from edges."
+    return im.crop(gutter_box(im.size, gutter))
+
 
+def resize(im: Image, size: tuple[int, int]):
+    "Resize, cropping if aspect ratios differ."
+    box = aspect_box(im.size, size)
+    if box:
+        im = im.crop(box)
     return im.resize(size)
 
 
-def posterize(im: Image, pal: Palette):
-    pal.image().save('pal.png')
-    return im.quantize(palette=pal.image())
\ No newline at end of file
+def posterize(im: Image, pal: Palette | Posterizer):
+    """
+    Quantize to a palette. Pass a Posterizer to reuse it across images.
+
+    Palettes over 256 colours give a Pattern rather than a 'P' image.
+    """
+    if not isinstance(pal, Posterizer):
+        pal = Posterizer(pal)
+    return pal(im)
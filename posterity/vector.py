@@ -0,0 +1,180 @@
+"""
+Vector charts, as SVG or PDF.
+
+Each symbol is defined once and placed per cell, runs of same-colour
+cells in a row are merged into one rectangle, and the grid is a single
+path. Output size follows the pattern's complexity, not its resolution.
+"""
+
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from .chart import key_colours
+from .pattern import Pattern
+
+GRID_COLOUR = {'real': (128, 128, 128), 'grid': (0, 0, 0)}
+
+
+def runs(indices: np.ndarray):
+    "Runs of equal cells in each row, as (y, x, length, index) arrays."
+    h, w = indices.shape
+    starts = np.ones((h, w), dtype=bool)
+    starts[:, 1:] = indices[:, 1:] != indices[:, :-1]
+    y, x = np.nonzero(starts)
+    flat = y * w + x
+    length = np.diff(np.append(flat, h * w))
+    # a run never continues onto the next row, as each row's start is one
+    return y, x, length, indices[y, x]
+
+
+def _colour_runs(pattern: Pattern):
+    "Runs grouped by palette index, as {index: (y, x, length)}."
+    y, x, length, index = runs(pattern.indices)
+    order = np.argsort(index, kind='stable')
+    y, x, length, index = y[order], x[order], length[order], index[order]
+    bounds = np.flatnonzero(np.diff(index)) + 1
+    return {
+        int(i[0]): (yy, xx, ll) for yy, xx, ll, i in zip(
+            *(np.split(a, bounds) for a in (y, x, length, index)))}
+
+
+def _hex(rgb):
+    return '#%02x%02x%02x' % tuple(rgb)
+
+
+def _escape(symbol: str):
+    return symbol.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def svg(pattern: Pattern, style='real', pixel_size=16, grid_width=1) -> str:
+    "A chart as an SVG document, in units of one cell."
+    w, h = pattern.size
+    palette = pattern.palette
+    used = np.unique(pattern.indices)
+    keys = key_colours(palette)
+    entries = list(palette)
+    colours = palette.array()
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" '
+        f'xmlns:xlink="http://www.w3.org/1999/xlink" '
+        f'width="{w * pixel_size}" height="{h * pixel_size}" '
+        f'viewBox="0 0 {w} {h}">',
+        '<defs font-size=".7" font-family="sans-serif" '
+        'text-anchor="middle" dominant-baseline="central">']
+    for i in used:
+        fill = _hex(keys[i]) if style == 'real' else '#000000'
+        out.append(
+            f'<text id="s{i}" x=".5" y=".5" fill="{fill}">'
+            f'{_escape(entries[i].symbol)}</text>')
+    out.append('</defs>')
+
+    if style == 'real':
+        for i, (y, x, length) in _colour_runs(pattern).items():
+            d = ''.join(
+                f'M{a} {b}h{n}v1h-{n}z' for a, b, n in zip(x, y, length))
+            out.append(f'<path fill="{_hex(colours[i])}" d="{d}"/>')
+    else:
+        out.append(f'<rect width="{w}" height="{h}" fill="#ffffff"/>')
+
+    for (y, x), i in np.ndenumerate(pattern.indices):
+        out.append(f'<use xlink:href="#s{i}" x="{x}" y="{y}"/>')
+
+    if grid_width:
+        d = ''.join(f'M{x} 0V{h}' for x in range(1, w)) \
+            + ''.join(f'M0 {y}H{w}' for y in range(1, h))
+        out.append(
+            f'<path fill="none" stroke="{_hex(GRID_COLOUR[style])}" '
+            f'stroke-width="{grid_width / pixel_size:g}" d="{d}"/>')
+    out.append('</svg>')
+    return '\n'.join(out)
+
+
+def _rg(rgb):
+    return ' '.join(f'{c / 255:.3g}' for c in rgb)
+
+
+def pdf(pattern: Pattern, style='real', pixel_size=16, grid_width=1) -> bytes:
+    """
+    A chart as a one-page PDF, pixel_size points per cell.
+
+    Symbols are set in Courier, whose equal widths centre simply;
+    they must be in the PDF's standard Latin encoding.
+    """
+    w, h = pattern.size
+    palette = pattern.palette
+    used = np.unique(pattern.indices)
+    keys = key_colours(palette)
+    entries = list(palette)
+    colours = palette.array()
+
+    # Cell units, with y flipped so row 0 is at the top
+    content = [f'{pixel_size} 0 0 {-pixel_size} 0 {h * pixel_size} cm']
+    if style == 'real':
+        for i, (y, x, length) in _colour_runs(pattern).items():
+            content.append(f'{_rg(colours[i])} rg')
+            content += (f'{a} {b} {n} 1 re' for a, b, n in zip(x, y, length))
+            content.append('f')
+    for (y, x), i in np.ndenumerate(pattern.indices):
+        content.append(f'1 0 0 1 {x} {y} cm /G{i} Do 1 0 0 1 {-x} {-y} cm')
+    if grid_width:
+        content.append(f'{_rg(GRID_COLOUR[style])} RG {grid_width / pixel_size:g} w')
+        content += (f'{x} 0 m {x} {h} l' for x in range(1, w))
+        content += (f'0 {y} m {w} {y} l' for y in range(1, h))
+        content.append('S')
+
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        None,  # page, once glyph objects are numbered
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier-Bold '
+        b'/Encoding /WinAnsiEncoding >>',
+    ]
+
+    def stream(data: bytes, extra=b''):
+        data = zlib.compress(data)
+        return (b'<< %s/Filter /FlateDecode /Length %d >>\nstream\n'
+            % (extra, len(data)) + data + b'\nendstream')
+
+    objects.append(stream('\n'.join(content).encode()))
+    glyphs = {}
+    for i in used:
+        fill = _rg(keys[i]) if style == 'real' else '0 0 0'
+        symbol = entries[i].symbol.encode('cp1252', 'replace')
+        symbol = symbol.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+        # Undo the flipped y for text, and centre a 0.6em wide glyph
+        glyph = b'%s rg BT /F1 0.7 Tf 1 0 0 -1 0.29 0.75 Tm (%s) Tj ET' % (
+            fill.encode(), symbol)
+        objects.append(stream(glyph, b'/Type /XObject /Subtype /Form '
+            b'/BBox [0 0 1 1] /Resources << /Font << /F1 4 0 R >> >> '))
+        glyphs[i] = len(objects)
+
+    xobjects = b' '.join(b'/G%d %d 0 R' % (i, n) for i, n in glyphs.items())
+    objects[2] = (
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+        b'/Resources << /Font << /F1 4 0 R >> /XObject << %s >> >> '
+        b'/Contents 5 0 R >>' % (w * pixel_size, h * pixel_size, xobjects))
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for n, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (n, obj)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % o for o in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+        len(objects) + 1, xref)
+    return bytes(out)
+
+
+def save(pattern: Pattern, path: Path, style='real', pixel_size=16, grid_width=1):
+    "Write a vector chart, as SVG or PDF by the path's suffix."
+    path = Path(path)
+    if path.suffix.lower() == '.svg':
+        path.write_text(svg(pattern, style, pixel_size, grid_width))
+    elif path.suffix.lower() == '.pdf':
+        path.write_bytes(pdf(pattern, style, pixel_size, grid_width))
+    else:
+        raise ValueError('Vector charts must be .svg or .pdf', path)